@@ -0,0 +1,237 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import time
+from collections import Counter
+
+import checkpoint
+import dataset
+import extractor
+import metrics
+from histogram import AttributeHistogram
+import validator
+import workers
+import writer
+
+__author__ = "Sephirothxlx"
+
+def read_targets(filename):
+    """
+    Read target uuids, one per line, skipping blank lines and # comments.
+    :param filename: path of the file
+    :return: <list> of uuid
+    """
+    targets = []
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith("#"):
+                targets.append(line)
+    return targets
+
+class SharedGraph(object):
+    """
+    Graph state shared by the targets of a batch: the member list and the member histogram of
+    every type and category, combined into the sibling histogram of each target.
+    With a checkpoint store, members and histograms are saved once computed and loaded back
+    instead of being recomputed.
+    """
+
+    def __init__(self, max_workers=None, checkpoint_store=None):
+        """
+        :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+        :param checkpoint_store: <CheckpointStore> the stage artifacts are saved to and loaded from
+        """
+        self.max_workers = max_workers
+        self.checkpoint_store = checkpoint_store
+        self.members = {}  # (kind, parent uuid) -> <list> of member uuid
+        self.histograms = {}  # (kind, parent uuid) -> (<AttributeHistogram>, <set> of member uuid not counted)
+        self.pending = Counter()  # (kind, parent uuid) -> number of targets still needing it
+
+    @staticmethod
+    def parent_keys(target_node):
+        """
+        :param target_node: <Node> whose parents are resolved
+        :return: <list> of (kind, parent uuid)
+        """
+        keys = [("type", p.uuid) for p in target_node.types]
+        keys += [("category", p.uuid) for p in target_node.categories]
+        return keys
+
+    def add_targets(self, target_nodes):
+        """
+        Register the targets of the batch, so that parents are released once their last target is done.
+        :param target_nodes: iterable of <Node> whose parents are resolved
+        """
+        for target_node in target_nodes:
+            self.pending.update(self.parent_keys(target_node))
+
+    def _get_members(self, keys):
+        store = self.checkpoint_store
+        missing = [key for key in keys if key not in self.members]
+        if store is not None:
+            for key in missing:
+                stored = store.get_members(*key)
+                if stored is not None:
+                    self.members[key] = stored
+            missing = [key for key in missing if key not in self.members]
+
+        def query(key):
+            if key[0] == "type":
+                return dataset.get_type_members(key[1])
+            return dataset.get_category_member(key[1])
+
+        for key, members, e in workers.map_bounded(query, missing, self.max_workers):
+            if e is not None:
+                raise e
+            self.members[key] = members
+            if store is not None:
+                store.put_members(key[0], key[1], members)
+
+    def _get_histogram(self, key):
+        if key not in self.histograms:
+            store = self.checkpoint_store
+            stored = store.get_histogram(*key) if store is not None else None
+            if stored is None:
+                failures = []
+                members = (extractor.id2node(uuid) for uuid in self.members[key])
+                histogram = extractor.count_nodes_attributes(members, None, self.max_workers, failures)
+                stored = (histogram, {node.uuid for node, e in failures})
+                if store is not None:
+                    store.put_histogram(key[0], key[1], *stored)
+            self.histograms[key] = stored
+        return self.histograms[key]
+
+    def get_histogram(self, target_node):
+        """
+        Get the siblings of the target and their attribute counts, combining the histograms of its
+        parents, each computed once per batch.
+        :param target_node: <Node> whose parents are resolved
+        :return: (<set> of sibling uuid, <AttributeHistogram>, <set> of sibling uuid not counted)
+        """
+        keys = self.parent_keys(target_node)
+        self._get_members(keys)
+        histogram = AttributeHistogram()
+        times_counted = Counter()
+        for key in keys:
+            parent_histogram, failed = self._get_histogram(key)
+            histogram.update(parent_histogram)
+            times_counted.update(uuid for uuid in self.members[key] if uuid not in failed)
+        siblings = set(times_counted)
+        for key in keys:
+            siblings.update(self.members[key])
+        # Siblings member of several parents are counted once per parent, the extra counts are removed
+        extra = {}
+        for uuid, times in times_counted.items():
+            if times > 1:
+                extra.setdefault(times - 1, []).append(extractor.id2node(uuid))
+        for weight, nodes in extra.items():
+            histogram.update(extractor.count_nodes_attributes(nodes, None, self.max_workers), -weight)
+        return siblings, histogram, siblings - set(times_counted)
+
+    def release(self, target_node):
+        """
+        Drop the members and histograms of the target's parents that no other target of the batch needs.
+        :param target_node: <Node> registered with add_targets()
+        """
+        for key in self.parent_keys(target_node):
+            self.pending[key] -= 1
+            if self.pending[key] <= 0:
+                del self.pending[key]
+                self.members.pop(key, None)
+                self.histograms.pop(key, None)
+
+def _resolve_parents(target_node, checkpoint_store):
+    if checkpoint_store is not None:
+        stored = checkpoint_store.get_parents(target_node.uuid)
+        if stored is not None:
+            target_node.types = {extractor.id2node(uuid) for uuid in stored[0]}
+            target_node.categories = {extractor.id2node(uuid) for uuid in stored[1]}
+            target_node.parents = target_node.types | target_node.categories
+            return
+    target_node.get_parents()
+    if checkpoint_store is not None:
+        checkpoint_store.put_parents(target_node)
+
+def extract_batch(targets, output_filename, ALPHA, max_workers=None, checkpoint_store=None):
+    """
+    Extract the properties of many targets, sharing the members and histograms of their types
+    and categories between targets.
+    With a checkpoint store, the targets already completed with the same ALPHA are skipped,
+    and the parents, members and histograms saved by earlier runs are reused whatever their ALPHA.
+    :param targets: iterable of uuid
+    :param output_filename: file the results are appended to, in the format given by its extension (see writer.py)
+    :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+    :param checkpoint_store: <CheckpointStore> progress is saved to and resumed from
+    :return: <list> of (uuid, seconds spent on the target), for the targets extracted by this run
+    """
+    targets = list(dict.fromkeys(targets))
+    params = checkpoint.params_key(ALPHA)
+    if checkpoint_store is not None:
+        completed = checkpoint_store.completed_targets(params)
+        if completed:
+            logging.info("Skipping {} targets completed by an earlier run".format(
+                len([uuid for uuid in targets if uuid in completed])))
+            targets = [uuid for uuid in targets if uuid not in completed]
+    graph = SharedGraph(max_workers, checkpoint_store)
+
+    # Resolve the parents first so that targets can be grouped by them
+    start = time.time()
+    target_nodes = [extractor.id2node(uuid) for uuid in targets]
+    parent_time = {}
+    for target_node in target_nodes:
+        t = time.time()
+        with metrics.stage("parents"):
+            _resolve_parents(target_node, checkpoint_store)
+        parent_time[target_node.uuid] = time.time() - t
+    graph.add_targets(target_nodes)
+    groups = {}
+    for target_node in target_nodes:
+        groups.setdefault(frozenset(p.uuid for p in target_node.parents), []).append(target_node)
+    logging.info("{} targets share {} distinct types and categories".format(len(target_nodes), len(graph.pending)))
+
+    timings = []
+    with writer.ResultWriter(output_filename) as result_writer:
+        for group in groups.values():
+            for target_node in group:
+                t = time.time()
+                with metrics.stage("counting"):
+                    siblings, histogram, failures = graph.get_histogram(target_node)
+                num_siblings = len(siblings)
+                target_attributes = extractor.infer_attributes(histogram, num_siblings - len(failures), ALPHA)
+                support = {x: histogram[x] for x in target_attributes}
+                scores = {}
+                target_attributes = validator.validate(target_node, target_attributes, support, None, scores, num_siblings)
+                with metrics.stage("output"):
+                    support = {x: support.get(x, 0) for x in target_attributes}
+                    result_writer.write(target_node.uuid, target_attributes, support, num_siblings, scores)
+                    if checkpoint_store is not None:
+                        # The result must be on disk before the target is recorded as completed
+                        result_writer.flush()
+                        checkpoint_store.mark_completed(target_node.uuid, params)
+                elapsed = parent_time[target_node.uuid] + time.time() - t
+                timings.append((target_node.uuid, elapsed))
+                logging.info("Extracted {} attributes for {} from {} siblings ({} failed) in {:.2f}s".format(
+                    len(target_attributes), target_node.uuid, num_siblings, len(failures), elapsed))
+                graph.release(target_node)
+
+    logging.info("Extracted {} targets in {:.2f}s".format(len(timings), time.time() - start))
+    return timings
+
+if __name__ == '__main__':
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Extract the properties of every target listed in a file.")
+    parser.add_argument("targets", help="file with one target uuid per line")
+    parser.add_argument("output", help="file the results are appended to, .jsonl and .nt for structured output")
+    parser.add_argument("alpha", type=float, help="minimum share of siblings having an attribute")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of concurrent queries")
+    parser.add_argument("--checkpoint", help="SQLite file progress is saved to, to resume an interrupted batch")
+    args = parser.parse_args()
+
+    store = checkpoint.CheckpointStore(args.checkpoint) if args.checkpoint else None
+    for uuid, elapsed in extract_batch(read_targets(args.targets), args.output, args.alpha, args.workers, store):
+        print("{}\t{:.2f}s".format(uuid, elapsed))
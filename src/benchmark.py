@@ -0,0 +1,159 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import json
+import logging
+import os
+import tempfile
+import time
+import tracemalloc
+
+import dataset
+import dbnode
+import extractor
+import metrics
+import search
+import synthetic
+import validator
+
+__author__ = "Sephirothxlx"
+
+#Graph sizes the suite runs at, from the smallest to the largest
+SCALES = [
+    {"num_types": 2, "category_fanout": 2, "siblings_per_class": 100, "attributes_per_entity": 10},
+    {"num_types": 4, "category_fanout": 3, "siblings_per_class": 1000, "attributes_per_entity": 20},
+    {"num_types": 8, "category_fanout": 4, "siblings_per_class": 5000, "attributes_per_entity": 30},
+]
+
+def _isolate(store):
+    """
+    Serve the store as backend with every cache disabled or emptied, so that runs are comparable.
+    """
+    dataset.use_backend(store)
+    dataset.QUERY_CACHE.disable()
+    search.SEARCH_CACHE.disable()
+    search.ENGINES = [synthetic.StubSearchEngine(name) for name in ("google", "baidu", "bing")]
+    dbnode.registry.clear()
+
+def _count_calls(summary):
+    return sum(stats["calls"] for stats in summary["functions"].values())
+
+def run_scale(params, ALPHA=0.5, targets=3, max_workers=None, seed=0):
+    """
+    Time extract, count_nodes_attributes and validate on one synthetic graph.
+    :param params: <dict> of arguments of synthetic.generate()
+    :param targets: number of targets extracted
+    :return: <dict> of the measures
+    """
+    start = time.time()
+    store = synthetic.generate(seed=seed, **params)
+    result = {"params": params, "triples": len(store), "generate": time.time() - start}
+    target_ids = [synthetic.entity_uuid(t % params["num_types"], t) for t in range(targets)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        output_filename = os.path.join(directory, "result.txt")
+
+        # End to end, every target from cold caches
+        elapsed = 0.0
+        queries = 0
+        for target_id in target_ids:
+            _isolate(store)
+            start = time.time()
+            extract_metrics = extractor.extract(target_id, output_filename, ALPHA, max_workers)
+            elapsed += time.time() - start
+            queries += _count_calls(extract_metrics.summary())
+        result["extract"] = {
+            "seconds": elapsed / targets,
+            "targets_per_second": targets / elapsed if elapsed else None,
+            "queries": queries / targets,
+        }
+
+        # Peak memory of one extraction, measured apart because tracing slows everything down
+        _isolate(store)
+        tracemalloc.start()
+        extractor.extract(target_ids[0], output_filename, ALPHA, max_workers)
+        result["extract"]["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    # Counting alone, on fresh siblings
+    _isolate(store)
+    target_node = dbnode.id2node(target_ids[0])
+    target_node.get_parents()
+    siblings = target_node.get_siblings(max_workers)
+    stage_metrics = metrics.Metrics()
+    previous = metrics.activate(stage_metrics)
+    try:
+        start = time.time()
+        histogram = extractor.count_nodes_attributes(siblings, None, max_workers)
+        elapsed = time.time() - start
+        result["count_nodes_attributes"] = {
+            "seconds": elapsed,
+            "siblings": len(siblings),
+            "siblings_per_second": len(siblings) / elapsed if elapsed else None,
+            "queries": _count_calls(stage_metrics.summary()),
+        }
+
+        # Validation alone, on the inferred attributes
+        stage_metrics = metrics.Metrics()
+        metrics.activate(stage_metrics)
+        attributes = extractor.infer_attributes(histogram, len(siblings), ALPHA)
+        support = {x: histogram[x] for x in attributes}
+        start = time.time()
+        validator.validate(target_node, attributes, support)
+        result["validate"] = {
+            "seconds": time.time() - start,
+            "attributes": len(attributes),
+            "queries": _count_calls(stage_metrics.summary()),
+        }
+    finally:
+        metrics.activate(previous)
+    dataset.use_backend(None)
+    return result
+
+def run(scales=None, ALPHA=0.5, targets=3, max_workers=None):
+    """
+    Run the suite at every scale.
+    :param scales: <list> of <dict> of arguments of synthetic.generate(), SCALES if not given
+    :return: <list> of <dict> of measures, one per scale
+    """
+    return [run_scale(params, ALPHA, targets, max_workers) for params in (scales or SCALES)]
+
+def report(results):
+    """
+    Format the measures as a table.
+    :param results: <list> returned by run()
+    :return: <str>
+    """
+    lines = ["{:>9} {:>10} {:>10} {:>9} {:>12} {:>10} {:>12} {:>10} {:>9}".format(
+        "triples", "extract s", "targets/s", "queries", "peak MiB", "count s", "siblings/s", "validate s", "queries")]
+    for r in results:
+        lines.append("{:>9} {:>10.3f} {:>10.2f} {:>9.0f} {:>12.1f} {:>10.3f} {:>12.0f} {:>10.3f} {:>9}".format(
+            r["triples"],
+            r["extract"]["seconds"],
+            r["extract"]["targets_per_second"] or 0,
+            r["extract"]["queries"],
+            r["extract"]["peak_bytes"] / 2 ** 20,
+            r["count_nodes_attributes"]["seconds"],
+            r["count_nodes_attributes"]["siblings_per_second"] or 0,
+            r["validate"]["seconds"],
+            r["validate"]["queries"],
+        ))
+    return "\n".join(lines)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark the extractor on synthetic knowledge graphs.")
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--targets", type=int, default=3, help="targets extracted per scale")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of concurrent queries")
+    parser.add_argument("--scales", type=int, default=len(SCALES), help="number of scales run, smallest first")
+    parser.add_argument("--json", help="file the measures are written to, to compare runs")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.WARNING)
+    results = run(SCALES[:args.scales], args.alpha, args.targets, args.workers)
+    print(report(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
@@ -0,0 +1,228 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+__author__ = "Sephirothxlx"
+
+#Default configurations for the query cache
+CACHE_FILENAME = os.path.join(os.path.expanduser("~"), ".dbpedia_extender", "sparql_cache.sqlite")
+CACHE_TTL = 7 * 24 * 3600  # seconds, None means never expire
+CACHE_MAX_ENTRIES = 200000
+CACHE_ACCESS_FLUSH = 1000  # access times of hits kept in memory before being written
+CACHE_EVICT_BATCH = 1000  # entries evicted at once past the size cap, so that eviction is not run on every store
+
+def normalize_query(sql):
+    """
+    Normalize the query text so that queries only differing in layout share an entry.
+    :param sql: SPARQL query
+    :return: <str> query with collapsed whitespace
+    """
+    return re.sub(r"\s+", " ", sql).strip()
+
+class QueryCache(object):
+    """
+    Persistent cache of query results stored in SQLite.
+    Entries are keyed on (endpoint, normalized query), expire after a TTL and the
+    least recently used ones are evicted once the size cap is reached.
+    Lookups never write: the access times of hits are kept in memory and written in one
+    transaction with the next store, or once CACHE_ACCESS_FLUSH of them are pending.
+    The number of entries is counted once, then kept up to date by the stores and evictions.
+    """
+
+    def __init__(self, filename=CACHE_FILENAME, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, enabled=True):
+        """
+        :param filename: path of the SQLite file, ":memory:" for a process-local cache
+        :param ttl: time to live of an entry in seconds, None for no expiry
+        :param max_entries: maximum number of entries kept, None for no limit
+        :param enabled: whether lookups and stores are performed
+        """
+        self.filename = filename
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._accessed = {}  # (endpoint, query) -> access time not written yet
+        self._entries = None  # number of entries, counted on the first store
+
+    def _connect(self):
+        if self._conn is None:
+            if self.filename != ":memory:":
+                directory = os.path.dirname(self.filename)
+                if directory and not os.path.isdir(directory):
+                    os.makedirs(directory)
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+            if self.filename != ":memory:":
+                # Readers never wait for a writer, and commits do not wait for the disk
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS query_cache (
+                    endpoint TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    accessed REAL NOT NULL,
+                    PRIMARY KEY (endpoint, query)
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS query_cache_accessed ON query_cache (accessed)")
+            self._conn.commit()
+        return self._conn
+
+    def _flush_accessed(self, conn):
+        if self._accessed:
+            conn.executemany(
+                "UPDATE query_cache SET accessed = ? WHERE endpoint = ? AND query = ?",
+                [(t, endpoint, query) for (endpoint, query), t in self._accessed.items()]
+            )
+            self._accessed = {}
+
+    def _lookup(self, conn, endpoint, query, now):
+        row = conn.execute(
+            "SELECT result, created FROM query_cache WHERE endpoint = ? AND query = ?",
+            (endpoint, query)
+        ).fetchone()
+        if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+            # Expired entries are left for put() to overwrite or for eviction
+            self.misses += 1
+            return None
+        self._accessed[(endpoint, query)] = now
+        self.hits += 1
+        return row[0]
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def get(self, endpoint, sql):
+        """
+        Look up the cached result of a query.
+        :param endpoint: dataset's address
+        :param sql: SPARQL query
+        :return: decoded result, None if missing or expired
+        """
+        if not self.enabled:
+            return None
+        query = normalize_query(sql)
+        with self._lock:
+            conn = self._connect()
+            result = self._lookup(conn, endpoint, query, time.time())
+            if len(self._accessed) >= CACHE_ACCESS_FLUSH:
+                self._flush_accessed(conn)
+                conn.commit()
+        return json.loads(result) if result is not None else None
+
+    def get_many(self, endpoint, sqls):
+        """
+        Look up the cached results of many queries in one transaction.
+        :param endpoint: dataset's address
+        :param sqls: iterable of SPARQL queries
+        :return: <dict> of {sql: decoded result} for the queries found, missing and expired ones left out
+        """
+        if not self.enabled:
+            return {}
+        results = {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            for sql in sqls:
+                result = self._lookup(conn, endpoint, normalize_query(sql), now)
+                if result is not None:
+                    results[sql] = json.loads(result)
+            if len(self._accessed) >= CACHE_ACCESS_FLUSH:
+                self._flush_accessed(conn)
+                conn.commit()
+        return results
+
+    def put(self, endpoint, sql, result):
+        """
+        Store the result of a query, evicting the least recently used entries if needed.
+        :param endpoint: dataset's address
+        :param sql: SPARQL query
+        :param result: JSON serializable query result
+        """
+        self.put_many(endpoint, {sql: result})
+
+    def put_many(self, endpoint, results):
+        """
+        Store the results of many queries in one transaction, evicting the least recently used entries if needed.
+        :param endpoint: dataset's address
+        :param results: <dict> of {sql: JSON serializable query result}
+        """
+        if not self.enabled or not results:
+            return
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._flush_accessed(conn)
+            if self._entries is None:
+                self._entries = conn.execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+            for sql, result in results.items():
+                query = normalize_query(sql)
+                exists = conn.execute(
+                    "SELECT 1 FROM query_cache WHERE endpoint = ? AND query = ?", (endpoint, query)
+                ).fetchone() is not None
+                conn.execute(
+                    "INSERT OR REPLACE INTO query_cache (endpoint, query, result, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                    (endpoint, query, json.dumps(result), now, now)
+                )
+                if not exists:
+                    self._entries += 1
+            if self.max_entries is not None and self._entries > self.max_entries:
+                # Evict a batch below the cap, so that the next stores do not evict at all
+                excess = self._entries - self.max_entries + min(CACHE_EVICT_BATCH, self.max_entries // 10)
+                deleted = conn.execute(
+                    "DELETE FROM query_cache WHERE rowid IN "
+                    "(SELECT rowid FROM query_cache ORDER BY accessed ASC LIMIT ?)",
+                    (excess,)
+                ).rowcount
+                self._entries -= deleted
+            conn.commit()
+
+    def clear(self):
+        """
+        Remove every entry and reset the counters.
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM query_cache")
+            conn.commit()
+            self._accessed = {}
+            self._entries = 0
+            self.hits = 0
+            self.misses = 0
+
+    def __len__(self):
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM query_cache").fetchone()[0]
+
+    def stats(self):
+        """
+        :return: <dict> of hits, misses, hit rate and number of entries
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._flush_accessed(self._conn)
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
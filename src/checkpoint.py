@@ -0,0 +1,186 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from histogram import AttributeHistogram
+from triplestore import dump_term, load_term
+
+__author__ = "Sephirothxlx"
+
+PARENTS = "parents"  # keyed by target uuid
+MEMBERS = "members"  # keyed by parent_key()
+HISTOGRAM = "histogram"  # keyed by parent_key()
+
+def parent_key(kind, parent_uuid):
+    """
+    :param kind: "type" or "category"
+    :param parent_uuid: uuid of the type or category
+    :return: <str> identifying the parent
+    """
+    return "{} {}".format(kind, parent_uuid)
+
+def params_key(ALPHA):
+    """
+    :return: <str> identifying the parameters a target was completed with
+    """
+    return json.dumps({"alpha": ALPHA}, sort_keys=True)
+
+class CheckpointStore(object):
+    """
+    Progress of batch extractions stored in SQLite: the targets completed with every set of
+    parameters, and the artifacts of the stages that do not depend on them (parents of every
+    target, members and attribute histogram of every type and category), so that a restarted or
+    re-parameterized batch only redoes the missing work.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: path of the SQLite file
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS artifacts (
+                    kind TEXT NOT NULL,
+                    key TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS completed (
+                    target TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    PRIMARY KEY (target, params)
+                )
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def get(self, kind, key):
+        """
+        :param kind: PARENTS, MEMBERS or HISTOGRAM
+        :param key: target uuid or parent_key()
+        :return: decoded artifact, None if missing
+        """
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT value FROM artifacts WHERE kind = ? AND key = ?", (kind, key)).fetchone()
+        if row is None:
+            return None
+        return json.loads(zlib.decompress(row[0]).decode("utf-8"))
+
+    def put(self, kind, key, value):
+        """
+        :param kind: PARENTS, MEMBERS or HISTOGRAM
+        :param key: target uuid or parent_key()
+        :param value: JSON serializable artifact
+        """
+        data = zlib.compress(json.dumps(value).encode("utf-8"))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO artifacts (kind, key, value, created) VALUES (?, ?, ?, ?)",
+                (kind, key, data, time.time()))
+            conn.commit()
+
+    def get_parents(self, target_uuid):
+        """
+        :return: (<list> of type uuid, <list> of category uuid), None if missing
+        """
+        value = self.get(PARENTS, target_uuid)
+        return None if value is None else (value["types"], value["categories"])
+
+    def put_parents(self, target_node):
+        """
+        :param target_node: <Node> whose parents are resolved
+        """
+        self.put(PARENTS, target_node.uuid, {
+            "types": sorted(p.uuid for p in target_node.types),
+            "categories": sorted(p.uuid for p in target_node.categories),
+        })
+
+    def get_members(self, kind, parent_uuid):
+        """
+        :param kind: "type" or "category"
+        :return: <list> of member uuid, None if missing
+        """
+        return self.get(MEMBERS, parent_key(kind, parent_uuid))
+
+    def put_members(self, kind, parent_uuid, members):
+        """
+        :param kind: "type" or "category"
+        :param members: iterable of member uuid
+        """
+        self.put(MEMBERS, parent_key(kind, parent_uuid), list(members))
+
+    def get_histogram(self, kind, parent_uuid):
+        """
+        :param kind: "type" or "category"
+        :return: (<AttributeHistogram> of the members, <set> of uuid of the members that could not be counted),
+            None if missing
+        """
+        value = self.get(HISTOGRAM, parent_key(kind, parent_uuid))
+        if value is None:
+            return None
+        return AttributeHistogram.from_items(((p, load_term(o)), c) for p, o, c in value["counts"]), set(value["failed"])
+
+    def put_histogram(self, kind, parent_uuid, histogram, failed=()):
+        """
+        :param kind: "type" or "category"
+        :param histogram: <AttributeHistogram> of the members
+        :param failed: iterable of uuid of the members that could not be counted
+        """
+        counts = [[p, dump_term(o), c] for (p, o), c in histogram.to_counter().items()]
+        self.put(HISTOGRAM, parent_key(kind, parent_uuid), {"counts": counts, "failed": sorted(failed)})
+
+    def is_completed(self, target_uuid, params):
+        """
+        :param params: params_key() of the run
+        """
+        with self._lock:
+            return self._connect().execute(
+                "SELECT 1 FROM completed WHERE target = ? AND params = ?", (target_uuid, params)).fetchone() is not None
+
+    def completed_targets(self, params):
+        """
+        :param params: params_key() of the run
+        :return: <set> of uuid of the targets completed with these parameters
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT target FROM completed WHERE params = ?", (params,)).fetchall()
+        return {row[0] for row in rows}
+
+    def mark_completed(self, target_uuid, params):
+        """
+        Record a target whose result is written.
+        :param params: params_key() of the run
+        """
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO completed (target, params, created) VALUES (?, ?, ?)",
+                (target_uuid, params, time.time()))
+            conn.commit()
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -1,10 +1,17 @@
 # !/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import functools
 import logging
+import os
 import pprint
+import threading
+import time
 
-from SPARQLWrapper import SPARQLWrapper, JSON
+import cache
+import metrics
+import transport
+import triplestore
 
 __author__ = "Sephirothxlx"
 
@@ -26,24 +33,172 @@ PREFIX skos: <http://www.w3.org/2004/02/skos/core#>
 PREFIX dbo: <http://dbpedia.org/ontology/>
 """
 
-def __execute_sparql(endpoint, sql):
+#Number of rows per request when paging through members, DBpedia returns at most 10000
+PAGE_SIZE = 10000
+
+#Number of entities whose PV-pairs are fetched by one query of get_pv_pairs_many()
+PV_CHUNK_SIZE = 20
+
+#Column of PV-pair queries giving "@" and the language of a tagged literal, the datatype of another literal,
+#and "" for an IRI, whose lang() fails
+PV_TAG = """(COALESCE(IF(lang(?o) != "", CONCAT("@", lang(?o)), str(datatype(?o))), "") AS ?tag)"""
+
+#Number of subjects per query of count_pv_support()
+SUPPORT_CHUNK_SIZE = 200
+
+#Format member and PV-pair queries ask for: "tsv" results are parsed line by line into tuples,
+#"json" results are decoded as a whole document first
+RESULT_FORMAT = "tsv"
+
+#Persistent cache of query results, use QUERY_CACHE.disable() or QUERY_CACHE.clear() to bypass or reset it
+QUERY_CACHE = cache.QueryCache()
+
+#Number of resources whose names are fetched by one query of get_resource_names()
+LABEL_CHUNK_SIZE = 200
+
+#Persistent cache of resource names, kept longer than query results since labels rarely change
+LABEL_CACHE = cache.QueryCache(
+    filename=os.path.join(os.path.dirname(cache.CACHE_FILENAME), "label_cache.sqlite"),
+    ttl=90 * 24 * 3600
+)
+
+#Names resolved by this process, keyed on resource uuid
+_label_memo = {}
+_label_lock = threading.Lock()
+
+#Memo of get_multi_valued() results keyed on (property, frozenset of category uuids)
+_multi_valued_memo = {}
+_multi_valued_lock = threading.Lock()
+
+#Precomputed class and category hierarchy (hierarchy.Hierarchy), see use_hierarchy()
+HIERARCHY = None
+
+def use_hierarchy(hierarchy):
+    """
+    Select the hierarchy index used to keep only the most specific types and categories.
+    :param hierarchy: <Hierarchy>, None to rely on SPARQL queries
+    """
+    global HIERARCHY
+    HIERARCHY = hierarchy
+
+#Local backend (e.g. a triplestore.TripleStore) answering queries instead of DBPEDIA_ENDPOINT
+BACKEND = None
+
+def use_backend(backend):
+    """
+    Select the backend answering the query functions of this module.
+    :param backend: object implementing them, e.g. <TripleStore>, None for the remote endpoint
+    """
+    global BACKEND
+    BACKEND = backend
+    with _multi_valued_lock:
+        _multi_valued_memo.clear()
+    with _label_lock:
+        _label_memo.clear()
+
+def _dispatch(func):
+    """
+    Route calls of a query function to BACKEND when it implements it.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        backend = BACKEND
+        if backend is not None and hasattr(backend, func.__name__):
+            start = time.time()
+            result = getattr(backend, func.__name__)(*args, **kwargs)
+            rows = len(result) if isinstance(result, (list, dict, set)) else None
+            metrics.current().record("local", func.__name__, time.time() - start, rows)
+            return result
+        return func(*args, **kwargs)
+    return wrapper
+
+def __execute_sparql(endpoint, sql, caller):
     """
     Get the query results by SPARQL.
     :param endpoint: dataset's address
     :param sql: SPARQL query
+    :param caller: name of the public function sending the query, metrics are recorded under it
     :return: <list> of entity
     """
-    sparql = SPARQLWrapper(endpoint)
-    sparql.setQuery(DBPEDIA_PREFIX + sql)
-    sparql.setReturnFormat(JSON)
-    return sparql.query().convert()
+    query = DBPEDIA_PREFIX + sql
+    start = time.time()
+    cached = transport.TRANSPORT.cached
+    result = QUERY_CACHE.get(endpoint, query) if cached else None
+    if result is not None:
+        metrics.current().record("sparql", caller, time.time() - start, _count_rows(result), cached=True)
+        return result
+    stats = {}
+    result = transport.TRANSPORT.sparql(endpoint, query, stats)
+    metrics.current().record("sparql", caller, time.time() - start, _count_rows(result), stats.get("bytes"))
+    if cached:
+        QUERY_CACHE.put(endpoint, query, result)
+    return result
 
+def __select_rows(endpoint, sql, variables, caller):
+    """
+    Get the rows of a SELECT query as tuples, in the compact RESULT_FORMAT.
+    :param endpoint: dataset's address
+    :param sql: SPARQL SELECT query
+    :param variables: <list> of names of the variables, without "?"
+    :param caller: name of the public function sending the query, metrics are recorded under it
+    :return: <list> of rows, each a sequence of the values of the variables in order
+    """
+    if RESULT_FORMAT == "json":
+        results = __execute_sparql(endpoint, sql, caller)["results"]["bindings"]
+        # Unbound variables are None, as in TSV results
+        return [tuple(result[v]["value"] if v in result else None for v in variables) for result in results]
+
+    query = DBPEDIA_PREFIX + sql
+    # TSV results are cached apart from the JSON results of the same query
+    cache_key = endpoint + "#tsv"
+    start = time.time()
+    cached = transport.TRANSPORT.cached
+    result = QUERY_CACHE.get(cache_key, query) if cached else None
+    if result is None:
+        stats = {}
+        result = transport.TRANSPORT.select(endpoint, query, stats)
+        metrics.current().record("sparql", caller, time.time() - start, len(result[1]), stats.get("bytes"))
+        if cached:
+            QUERY_CACHE.put(cache_key, query, result)
+    else:
+        metrics.current().record("sparql", caller, time.time() - start, len(result[1]), cached=True)
+    header, rows = result
+    if not rows:
+        # An empty response may come without its header line
+        return []
+    columns = [header.index(v) for v in variables]
+    if columns != list(range(len(header))):
+        # Rows are only copied when the endpoint returns other columns or another order
+        rows = [tuple(row[i] for i in columns) for row in rows]
+    return rows
+
+def _count_rows(result):
+    try:
+        return len(result["results"]["bindings"])
+    except (KeyError, TypeError):
+        return None
+
+@_dispatch
 def get_categories(entity_id):
     """
     Get all the categories of an entity from DB-pedia.
     :param entity_id: universal identifier of the entity
     :return: <list> of entity, each is a category of the target entity
     """
+    if HIERARCHY is not None:
+        # The hierarchy index keeps the most specific categories locally, see dbnode.Node.get_parents()
+        dbpedia_sql = """
+            PREFIX e: <%s>
+            SELECT DISTINCT ?category
+            WHERE {
+                {e: dct:subject ?category .}
+                UNION
+                {e: dbo:category ?category .}
+            }
+        """ % entity_id
+        results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "get_categories")["results"]["bindings"]
+        return [result["category"]["value"] for result in results]
+
     dbpedia_sql = """
         PREFIX e: <%s>
         SELECT DISTINCT ?category
@@ -60,10 +215,11 @@ def get_categories(entity_id):
             {e: dbo:category ?category .}
         }
     """ % entity_id
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "get_categories")["results"]["bindings"]
     return [result["category"]["value"] for result in results]
 
 
+@_dispatch
 def get_types(entity_id):
     """
     Get types of an entity from DB-pedia and YAGO.
@@ -88,9 +244,10 @@ def get_types(entity_id):
             }
         }
     """ % entity_id
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "get_types")["results"]["bindings"]
     return [result["type"]["value"] for result in results]
 
+@_dispatch
 def get_super_classes(class_id):
     """
     Get the super classes of the dbpedia class
@@ -108,14 +265,90 @@ def get_super_classes(class_id):
             }
         }
     """ % class_id
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "get_super_classes")["results"]["bindings"]
     return [result["o"]["value"] for result in results]
 
-def get_type_members(type_id):
+@_dispatch
+def get_type_parents_many(type_ids):
     """
-    Get entities whose types contain <type_id>
+    Get the super classes and the types of many classes in one query,
+    the same as calling get_super_classes() and get_types() for each of them.
+    :param type_ids: <list> of uuid of classes
+    :return: <dict> of {type_id: <list> of uuid of super classes and types}
+    """
+    type_ids = list(dict.fromkeys(type_ids))
+    parents = {type_id: [] for type_id in type_ids}
+    if not type_ids:
+        return parents
+    dbpedia_sql = """
+        SELECT DISTINCT ?c ?o
+        WHERE {
+            VALUES ?c { %s }
+            {
+                GRAPH <http://dbpedia.org/resource/classes#> {
+                    ?c rdfs:subClassOf ?o
+                }
+            }
+            UNION
+            {
+                {{?c dbo:type ?o .}
+                UNION
+                {?c rdf:type ?o .}}
+                UNION
+                {?c dbpedia2:type ?o .}
+                FILTER NOT EXISTS {
+                    {?c dbo:type ?subtype .}
+                    UNION
+                    {?c rdf:type ?subtype .}
+                    ?subtype rdfs:subClassOf ?o .
+                    FILTER (?subtype != ?o)
+                }
+            }
+        }
+    """ % " ".join("<%s>" % type_id for type_id in type_ids)
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "get_type_parents_many")["results"]["bindings"]
+    for result in results:
+        parents[result["c"]["value"]].append(result["o"]["value"])
+    return parents
+
+def _iter_pages(dbpedia_sql, variable, caller, page_size=None):
+    """
+    Page through the results of a query in a stable order, one page per request.
+    The query is wrapped in a sub-select ordered by the variable, so that the endpoint
+    neither truncates the results at its row limit nor reorders them between pages.
+    :param dbpedia_sql: SELECT DISTINCT query projecting the variable
+    :param variable: <str> name of the variable, without "?"
+    :param caller: name of the public function paging, see __execute_sparql()
+    :param page_size: number of rows per request, PAGE_SIZE if not given
+    :return: generator of values of the variable
+    """
+    page_size = page_size or PAGE_SIZE
+    offset = 0
+    while True:
+        page_sql = """
+            SELECT ?%s
+            WHERE {
+                {
+                    %s
+                    ORDER BY ?%s
+                }
+            }
+            LIMIT %d OFFSET %d
+        """ % (variable, dbpedia_sql, variable, page_size, offset)
+        results = __select_rows(DBPEDIA_ENDPOINT, page_sql, [variable], caller)
+        for result in results:
+            yield result[0]
+        if len(results) < page_size:
+            return
+        offset += page_size
+
+@_dispatch
+def iter_type_members(type_id, page_size=None):
+    """
+    Stream entities whose types contain <type_id>, page by page
     :param type_id: uuid of th type
-    :return: <list> of entity
+    :param page_size: number of entities per request, PAGE_SIZE if not given
+    :return: generator of entity
     """
     dbpedia_sql = """
         SELECT DISTINCT ?subject
@@ -128,17 +361,26 @@ def get_type_members(type_id):
            UNION
            {?subject owl:type <%s> .}
         }
-        ORDER BY ?type
     """ % (type_id, type_id, type_id, type_id)
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    return [result["subject"]["value"] for result in results]
+    return _iter_pages(dbpedia_sql, "subject", "iter_type_members", page_size)
 
-def get_category_member(category_id):
+@_dispatch
+def get_type_members(type_id):
     """
-    Get entities whose categories contain <category_id>
-    :param category_id: uuid of the category
+    Get entities whose types contain <type_id>
+    :param type_id: uuid of th type
     :return: <list> of entity
     """
+    return list(iter_type_members(type_id))
+
+@_dispatch
+def iter_category_member(category_id, page_size=None):
+    """
+    Stream entities whose categories contain <category_id>, page by page
+    :param category_id: uuid of the category
+    :param page_size: number of entities per request, PAGE_SIZE if not given
+    :return: generator of entity
+    """
     dbpedia_sql = """
         SELECT DISTINCT ?subject
         WHERE {
@@ -147,9 +389,18 @@ def get_category_member(category_id):
             {?subject dbo:category <%s>}
         }
     """ % (category_id, category_id)
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    return [result["subject"]["value"] for result in results]
+    return _iter_pages(dbpedia_sql, "subject", "iter_category_member", page_size)
+
+@_dispatch
+def get_category_member(category_id):
+    """
+    Get entities whose categories contain <category_id>
+    :param category_id: uuid of the category
+    :return: <list> of entity
+    """
+    return list(iter_category_member(category_id))
 
+@_dispatch
 def get_pv_pairs(entity_id):
     """
     Get property-value pairs of the target entity from YAGO and DB-pedia.
@@ -157,7 +408,7 @@ def get_pv_pairs(entity_id):
     :return: <list> of (property, value)
     """
     dbpedia_sql = """
-        SELECT DISTINCT ?p ?o
+        SELECT DISTINCT ?p ?o (isLiteral(?o) AS ?literal) %s
         WHERE {
             {<%s> ?p ?o}
             FILTER (?p != <http://dbpedia.org/ontology/wikiPageID>)
@@ -167,58 +418,150 @@ def get_pv_pairs(entity_id):
 
         }
         ORDER BY ?p
-    """ % entity_id
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    return [(result["p"]["value"], result["o"]["value"]) for result in results]
+    """ % (PV_TAG, entity_id)
+    rows = __select_rows(DBPEDIA_ENDPOINT, dbpedia_sql, ["p", "o", "literal", "tag"], "get_pv_pairs")
+    return [(p, _pv_value(o, literal, tag)) for p, o, literal, tag in rows]
 
-def is_multi_valued(property_id, target_node):
+@_dispatch
+def get_pv_pairs_many(entity_ids, chunk_size=None):
     """
-    Check if the property is multi-valued.
-    Calculate all predicates of <SPO> in DB-pedia, those objectives values of
-    predicates that occur more than once are treated as multi-value attributes.
-    :return: <bool>
+    Get property-value pairs of many entities, sending one query per chunk of entities.
+    :param entity_ids: <list> of universal identifiers of the entities
+    :param chunk_size: number of entities per query, PV_CHUNK_SIZE if not given
+    :return: <dict> of {entity_id: <list> of (property, value)}
     """
-    p = property_id.lstrip('\'').rstrip('\'')
-
-    ss = ""
-    for x in target_node.categories:
-        if x.uuid !="":
-            ss += "{?s dct:subject " + "<" + x.uuid.rstrip("\n") + ">} UNION"
-    ss = ss.rstrip("UNION")
+    chunk_size = chunk_size or PV_CHUNK_SIZE
+    entity_ids = list(dict.fromkeys(entity_ids))
+    pv_pairs = {entity_id: [] for entity_id in entity_ids}
+    for i in range(0, len(entity_ids), chunk_size):
+        for s, p, o, literal, tag in _pv_rows(entity_ids[i:i + chunk_size]):
+            pv_pairs[s].append((p, _pv_value(o, literal, tag)))
+    return pv_pairs
 
+def _pv_rows(entity_ids, offset=None):
+    """
+    Get the PV-pairs rows of entities, never truncated by the row limit of the endpoint:
+    a chunk reaching PAGE_SIZE rows is split in two, and a single entity reaching it is paged.
+    :param entity_ids: <list> of uuid
+    :param offset: offset of the page for a single entity, None for no paging
+    :return: <list> of (entity, property, value, literal flag, tag), see _pv_value()
+    """
     dbpedia_sql = """
-    SELECT COUNT(DISTINCT ?s) AS ?n
-    WHERE {
-        ?s  <%s> ?o1 .
-        {
-            %s
+        SELECT DISTINCT ?s ?p ?o (isLiteral(?o) AS ?literal) %s
+        WHERE {
+            VALUES ?s { %s }
+            ?s ?p ?o
+            FILTER (?p != <http://dbpedia.org/ontology/wikiPageID>)
+            FILTER (?p != <http://dbpedia.org/ontology/wikiPageRevisionID>)
+            FILTER (?p != <http://dbpedia.org/ontology/wikiPageWikiLink>)
+            FILTER (?p != <http://dbpedia.org/ontology/wikiPageExternalLink>)
         }
-    }
-    """ % (p, ss)
+        ORDER BY ?s ?p ?o
+    """ % (PV_TAG, " ".join("<%s>" % entity_id for entity_id in entity_ids))
+    if offset is not None:
+        dbpedia_sql += "LIMIT %d OFFSET %d" % (PAGE_SIZE, offset)
+    rows = __select_rows(DBPEDIA_ENDPOINT, dbpedia_sql, ["s", "p", "o", "literal", "tag"], "get_pv_pairs_many")
+    if len(rows) < PAGE_SIZE:
+        return rows
+    if offset is not None:
+        return rows + _pv_rows(entity_ids, offset + PAGE_SIZE)
+    if len(entity_ids) > 1:
+        # The response may be truncated, query each half on its own
+        half = len(entity_ids) // 2
+        return _pv_rows(entity_ids[:half]) + _pv_rows(entity_ids[half:])
+    return _pv_rows(entity_ids, 0)
 
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    total = int(results[0]["n"]["value"])
+def _pv_value(value, literal, tag=None):
+    """
+    :param value: value of a PV-pair
+    :param literal: isLiteral() of the value as written in the results, "true" or "1" for a literal
+    :param tag: PV_TAG of the value, "@" and the language of a tagged literal or the datatype of a typed one
+    :return: <triplestore.Literal> for a literal, the IRI otherwise
+    """
+    if literal not in ("true", "1"):
+        return value
+    if tag and tag.startswith("@"):
+        return triplestore.Literal(value, tag[1:])
+    return triplestore.Literal(value, None, tag or None)
+
+def _strip_property(property_id):
+    return property_id.lstrip('\'').rstrip('\'')
+
+def _category_key(target_node):
+    return frozenset(x.uuid.rstrip("\n") for x in target_node.categories if x.uuid != "")
+
+@_dispatch
+def count_multi_valued(property_ids, target_node):
+    """
+    Count, for every property, the entities sharing a category with the target that have it,
+    and those among them that have more than one value, in one grouped query.
+    :param property_ids: <list> of uuid of properties
+    :param target_node: <Node> whose categories are considered
+    :return: <dict> of {property_id: (total, multi)}
+    """
+    properties = sorted({_strip_property(p) for p in property_ids})
+    counts = {p: (0, 0) for p in properties}
+    if not properties:
+        return counts
+
+    ss = ""
+    for x in sorted(_category_key(target_node)):
+        ss += "{?s dct:subject " + "<" + x + ">} UNION"
+    ss = ss.rstrip("UNION")
 
     dbpedia_sql = """
-    SELECT COUNT(DISTINCT ?s) AS ?n
+    SELECT ?p (COUNT(DISTINCT ?s) AS ?total) (COUNT(DISTINCT ?m) AS ?multi)
     WHERE {
-        ?s  <%s> ?o1 .
-        ?s  <%s> ?o2 .
-        FILTER (?o1 != ?o2)
+        VALUES ?p { %s }
+        ?s  ?p ?o1 .
         {
             %s
         }
+        OPTIONAL {
+            ?s  ?p ?o2 .
+            BIND (?s AS ?m)
+            FILTER (?o1 != ?o2)
+        }
     }
-    """ % (p, p, ss)
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    multi = int(results[0]["n"]["value"])
+    GROUP BY ?p
+    """ % (" ".join("<%s>" % p for p in properties), ss)
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "count_multi_valued")["results"]["bindings"]
+    for result in results:
+        counts[result["p"]["value"]] = (int(result["total"]["value"]), int(result["multi"]["value"]))
+    return counts
 
-    single = total - multi
-    if single >= multi:
-        return False
-    else:
-        return True
+def get_multi_valued(property_ids, target_node):
+    """
+    Check which properties are multi-valued among the entities sharing a category with the target.
+    Results are memoized per (property, set of categories), only unknown properties are queried.
+    :param property_ids: <list> of uuid of properties
+    :param target_node: <Node> whose categories are considered
+    :return: <dict> of {property_id: <bool>}
+    """
+    categories = _category_key(target_node)
+    with _multi_valued_lock:
+        known = {p: _multi_valued_memo.get((_strip_property(p), categories)) for p in property_ids}
+    missing = [p for p in known if known[p] is None]
+    if missing:
+        counts = count_multi_valued(missing, target_node)
+        with _multi_valued_lock:
+            for p in missing:
+                total, multi = counts.get(_strip_property(p), (0, 0))
+                single = total - multi
+                known[p] = single < multi
+                _multi_valued_memo[(_strip_property(p), categories)] = known[p]
+    return known
 
+def is_multi_valued(property_id, target_node):
+    """
+    Check if the property is multi-valued.
+    Calculate all predicates of <SPO> in DB-pedia, those objectives values of
+    predicates that occur more than once are treated as multi-value attributes.
+    :return: <bool>
+    """
+    return get_multi_valued([property_id], target_node)[property_id]
+
+@_dispatch
 def has_pv_pair(subject_id, property_id, value_id):
     """
     Check if there is such a triple
@@ -234,32 +577,103 @@ def has_pv_pair(subject_id, property_id, value_id):
             FILTER (?s = <%s>)
         }
     """ % (property_id, value_id, subject_id)
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
+    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "has_pv_pair")["results"]["bindings"]
     if int(results[0]["n"]["value"]) == 1:
         return True
     else:
         return False
 
+@_dispatch
+def count_pv_support(subject_ids, property_id):
+    """
+    Count, for every value of a property, how many of the given subjects have it.
+    Sends one aggregate query per SUPPORT_CHUNK_SIZE subjects instead of one per subject.
+    :param subject_ids: <list> of uuid of the subjects
+    :param property_id: uuid of the property
+    :return: <dict> of {value: number of subjects}
+    """
+    subject_ids = list(dict.fromkeys(subject_ids))
+    support = {}
+    for i in range(0, len(subject_ids), SUPPORT_CHUNK_SIZE):
+        chunk = subject_ids[i:i + SUPPORT_CHUNK_SIZE]
+        dbpedia_sql = """
+            SELECT ?o (COUNT(DISTINCT ?s) AS ?n)
+            WHERE {
+                VALUES ?s { %s }
+                ?s <%s> ?o
+            }
+            GROUP BY ?o
+        """ % (" ".join("<%s>" % subject_id for subject_id in chunk), property_id)
+        results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql, "count_pv_support")["results"]["bindings"]
+        for result in results:
+            value = result["o"]["value"]
+            support[value] = support.get(value, 0) + int(result["n"]["value"])
+    return support
+
 def get_resource_name(resource_id):
     """
     Get human-readable English name of the resource if available
     :param resource_id: uuid of the resource, resource could be any entity and relation
     :return: <str> name from dbpedia if available, extract from uuid if not
     """
-    dbpedia_sql = """
-        SELECT DISTINCT ?name
-        WHERE {
-            {<%s> foaf:name ?name . }
-            UNION
-            {<%s> rdfs:label ?name . }
-            FILTER (LANG(?name) = "en")
-        }
-    """ % (resource_id, resource_id)
-    results = __execute_sparql(DBPEDIA_ENDPOINT, dbpedia_sql)["results"]["bindings"]
-    if results:
-        return results[0]["name"]["value"]
-    else:
-        return resource_id.rsplit("/", 1)[-1]
+    return get_labels([resource_id])[resource_id]
+
+def get_labels(resource_ids):
+    """
+    Get the names of many resources, from the label caches when known,
+    querying the unknown ones in bulk with get_resource_names().
+    :param resource_ids: iterable of uuid of resources
+    :return: <dict> of {resource_id: name}
+    """
+    resource_ids = list(dict.fromkeys(resource_ids))
+    with _label_lock:
+        labels = {r: _label_memo[r] for r in resource_ids if r in _label_memo}
+    missing = [r for r in resource_ids if r not in labels]
+    # A local backend answers fast enough, only names from the endpoint are kept across runs
+    persistent = BACKEND is None and transport.TRANSPORT.cached
+    if persistent and missing:
+        # Every known name is read in one transaction
+        labels.update(LABEL_CACHE.get_many(DBPEDIA_ENDPOINT, missing))
+        missing = [r for r in missing if r not in labels]
+    if missing:
+        names = get_resource_names(missing)
+        for r in missing:
+            labels[r] = names[r]
+        if persistent:
+            # Every new name is written in one transaction
+            LABEL_CACHE.put_many(DBPEDIA_ENDPOINT, {r: names[r] for r in missing})
+    with _label_lock:
+        _label_memo.update(labels)
+    return labels
+
+@_dispatch
+def get_resource_names(resource_ids, chunk_size=None):
+    """
+    Get human-readable English names of many resources, one row per resource and one query per chunk.
+    :param resource_ids: <list> of uuid of resources
+    :param chunk_size: number of resources per query, LABEL_CHUNK_SIZE if not given
+    :return: <dict> of {resource_id: name from dbpedia if available, extract from uuid if not}
+    """
+    chunk_size = chunk_size or LABEL_CHUNK_SIZE
+    resource_ids = list(dict.fromkeys(resource_ids))
+    names = {r: r.rsplit("/", 1)[-1] for r in resource_ids}
+    for i in range(0, len(resource_ids), chunk_size):
+        chunk = resource_ids[i:i + chunk_size]
+        dbpedia_sql = """
+            SELECT ?r (SAMPLE(?n) AS ?name)
+            WHERE {
+                VALUES ?r { %s }
+                {?r foaf:name ?n . }
+                UNION
+                {?r rdfs:label ?n . }
+                FILTER (LANG(?n) = "en")
+            }
+            GROUP BY ?r
+            LIMIT %d
+        """ % (" ".join("<%s>" % r for r in chunk), len(chunk))
+        for r, name in __select_rows(DBPEDIA_ENDPOINT, dbpedia_sql, ["r", "name"], "get_resource_names"):
+            names[r] = name
+    return names
 
 def get_csks(entity_id):
     """
@@ -1,16 +1,32 @@
 # !/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import logging
+import threading
+import weakref
+from collections import OrderedDict
+from itertools import islice
+
 import dataset
+import metrics
+import workers
 
 __author__ = "Sephirothxlx"
 
+#Maximum number of nodes with cached data kept alive by the registry
+REGISTRY_MAX_NODES = 100000
+
 class Node(object):
     """
     Node of the knowledge graph.
     Entity, category, type and value in PV-pair are all nodes.
     """
 
+    __slots__ = (
+        "uuid", "types", "categories", "parents", "siblings", "attributes",
+        "extracted_attributes", "extracted_correct_attributes", "__weakref__",
+    )
+
     def __init__(self, uuid):
         """
         :param uuid: universal identifier
@@ -47,30 +63,85 @@ class Node(object):
         :return: <list> of <Node>
         """
         if not self.parents:
-            all_types = [Node(type_id) for type_id in dataset.get_types(self.uuid)]
+            hierarchy = dataset.HIERARCHY
+            all_types = [id2node(type_id) for type_id in dataset.get_types(self.uuid)]
             self.types = set(all_types)
-            type_parents=[]
-            for type_node in all_types:
-                type_parents = type_parents + dataset.get_super_classes(type_node.uuid) + dataset.get_types(type_node.uuid)
-            self.types = {node for node in self.types if node.uuid not in type_parents}
-            all_categories = [Node(category_id) for category_id in dataset.get_categories(self.uuid)]
+            if hierarchy is not None:
+                # Keep the most specific types with the precomputed closure, no query needed
+                specific = set(hierarchy.most_specific([type_node.uuid for type_node in all_types]))
+                self.types = {node for node in self.types if node.uuid in specific}
+            else:
+                # Super classes and types of every type, resolved in one query
+                type_parents = set()
+                for parents in dataset.get_type_parents_many([type_node.uuid for type_node in all_types]).values():
+                    type_parents.update(parents)
+                self.types = {node for node in self.types if node.uuid not in type_parents}
+            category_ids = dataset.get_categories(self.uuid)
+            if hierarchy is not None:
+                category_ids = hierarchy.most_specific(category_ids)
+            all_categories = [id2node(category_id) for category_id in category_ids]
             self.categories=set(all_categories)
             self.parents=self.types | self.categories
+            registry.retain(self)
         return self.parents
 
-    def get_siblings(self):
+    def _member_streams(self):
+        streams = [(dataset.iter_type_members, p.uuid) for p in self.types]
+        streams += [(dataset.iter_category_member, s.uuid) for s in self.categories]
+        return streams
+
+    def iter_siblings(self, max_workers=None):
+        """
+        Stream sibling nodes of the target node as their member pages arrive, the next page of
+        every parent being fetched concurrently under the "siblings" stage;
+        each sibling is yielded once and kept as self.siblings once the stream is exhausted
+        :param max_workers: maximum number of concurrent member queries, workers.MAX_WORKERS if not given
+        :return: generator of <Node>
+        """
+        if self.siblings:
+            yield from self.siblings
+            return
+        seen = set()
+        siblings = set()
+        page_size = dataset.PAGE_SIZE
+        with metrics.stage("siblings"):
+            streams = [query(parent_id, page_size) for query, parent_id in self._member_streams()]
+        next_page = lambda stream: list(islice(stream, page_size))
+        while streams:
+            # Pages are fetched between the chunks the caller consumes, never while it counts them
+            with metrics.stage("siblings"):
+                pages = workers.map_bounded(next_page, streams, max_workers)
+            streams = []
+            for stream, page, e in pages:
+                if e is not None:
+                    raise e
+                if len(page) == page_size:
+                    streams.append(stream)
+                for c in page:
+                    if c not in seen:
+                        seen.add(c)
+                        node = id2node(c)
+                        siblings.add(node)
+                        yield node
+        self.siblings = siblings
+        registry.retain(self)
+
+    def get_siblings(self, max_workers=None):
         """
         Get sibling nodes of the target node
+        :param max_workers: maximum number of concurrent member queries, workers.MAX_WORKERS if not given
         :return: <list> of <Node>
         """
         if not self.siblings:
-            self.siblings = set()
-            for p in self.types:
-                children = dataset.get_type_members(p.uuid)
-                self.siblings = self.siblings.union({Node(c) for c in children})
-            for s in self.categories:
-                children = dataset.get_category_member(s.uuid)
-                self.siblings = self.siblings.union({Node(c) for c in children})
+            siblings = set()
+            # Every member stream is consumed page by page into nodes, never as a full list of uuids
+            consume = lambda q: {id2node(c) for c in q[0](q[1])}
+            for query, children, e in workers.map_bounded(consume, self._member_streams(), max_workers):
+                if e is not None:
+                    raise e
+                siblings.update(children)
+            self.siblings = siblings
+            registry.retain(self)
 
         return self.siblings
 
@@ -79,14 +150,127 @@ class Node(object):
         Get the valid attributes of the node
         :return: <list> of (property<Edge>, value<Node>)
         """
-        if not self.attributes:
+        if self.attributes is None:
             # Get PV-pairs and CSK from database
             pv_pairs = dataset.get_pv_pairs(self.uuid)
             csks = dataset.get_csks(self.uuid)
             # Merge duplicated attributes
             self.attributes = set(pv_pairs + csks)
+            registry.retain(self)
 
         if self.extracted_correct_attributes:
             return self.attributes.union(self.extracted_correct_attributes)
         else:
-            return self.attributes
\ No newline at end of file
+            return self.attributes
+
+    @staticmethod
+    def prefetch_attributes(nodes, chunk_size=None, max_workers=None):
+        """
+        Fill the attributes of many nodes at once with batched PV-pair queries.
+        Nodes of a chunk whose query failed are left untouched, get_attributes() fetches them later.
+        :param nodes: <list> of <Node>
+        :param chunk_size: number of nodes per query, dataset.PV_CHUNK_SIZE if not given
+        :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+        :return: <int> number of nodes filled
+        """
+        chunk_size = chunk_size or dataset.PV_CHUNK_SIZE
+        pending = [node for node in nodes if node.attributes is None]
+        chunks = [pending[i:i + chunk_size] for i in range(0, len(pending), chunk_size)]
+        fetch = lambda chunk: dataset.get_pv_pairs_many([node.uuid for node in chunk], chunk_size)
+        filled = 0
+        for chunk, pv_pairs, e in workers.map_bounded(fetch, chunks, max_workers):
+            if e is not None:
+                logging.warning("Prefetching attributes of {} nodes failed: {}".format(len(chunk), e))
+                continue
+            for node in chunk:
+                node.attributes = set(pv_pairs.get(node.uuid, []) + dataset.get_csks(node.uuid))
+                registry.retain(node)
+                filled += 1
+        return filled
+
+class NodeRegistry(object):
+    """
+    Canonical map from uuid to <Node>, shared by every module.
+    Nodes are referenced weakly, so a node nobody uses anymore is dropped. Nodes holding
+    cached data are also kept alive, up to max_nodes of them, the least recently used first evicted.
+    """
+
+    def __init__(self, max_nodes=REGISTRY_MAX_NODES):
+        """
+        :param max_nodes: maximum number of nodes with cached data kept alive, None for no limit
+        """
+        self.max_nodes = max_nodes
+        self.nodes = weakref.WeakValueDictionary()
+        self.retained = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def get(self, uuid):
+        """
+        Get the node of id, creating it if needed
+        :param uuid: universal identifier of the node
+        :return: <Node>
+        """
+        with self._lock:
+            node = self.nodes.get(uuid)
+            if node is None:
+                self.misses += 1
+                node = Node(uuid)
+                self.nodes[uuid] = node
+            else:
+                self.hits += 1
+                if uuid in self.retained:
+                    self.retained.move_to_end(uuid)
+            return node
+
+    def retain(self, node):
+        """
+        Keep a node alive because it holds cached data.
+        :param node: <Node> returned by get()
+        """
+        with self._lock:
+            if self.nodes.get(node.uuid) is not node:
+                return
+            self.retained[node.uuid] = node
+            self.retained.move_to_end(node.uuid)
+            if self.max_nodes is not None:
+                while len(self.retained) > self.max_nodes:
+                    self.retained.popitem(last=False)
+                    self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.nodes = weakref.WeakValueDictionary()
+            self.retained.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def stats(self):
+        """
+        :return: <dict> of size, retained nodes, hits, misses, hit rate and evictions
+        """
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.nodes),
+            "retained": len(self.retained),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+        }
+
+registry = NodeRegistry()
+
+def id2node(uuid):
+    """
+    Get the node of id
+    :param uuid: universal identifier of the node
+    :return: <Node>
+    """
+    return registry.get(uuid)
@@ -2,50 +2,57 @@
 # -*- coding: utf-8 -*-
 
 import logging
-import numpy
-from collections import Counter
 
+import dbnode
 from dbnode import Node
+from histogram import AttributeHistogram
 import dataset
+import metrics
+import sampling as sampling_module
+import scheduler
 import validator
+import workers
+import writer
 
 __author__ = "Sephirothxlx"
 
-id_node_map = {}
-
 def id2node(uuid):
     """
     Get the node of id
     :param uuid: universal identifier of the node
     :return: <Node>
     """
-    if uuid in id_node_map:
-        return id_node_map[uuid]
-    else:
-        node = Node(uuid)
-        id_node_map[uuid] = node
-        return node
-
-def count_nodes_attributes(nodes, attributes_set):
+    return dbnode.id2node(uuid)
+
+def count_nodes_attributes(nodes, attributes_set=None, max_workers=None, failures=None):
     """
     Count the attributes of a list of nodes
-    :param nodes: <list> of <Node>
-    :param attributes_set: <set> of <Attributes>
-    :return: <Counter> of attributes with their occurrences
+    :param nodes: iterable of <Node>, consumed lazily chunk by chunk
+    :param attributes_set: <set> filled with the attributes if given
+    :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+    :param failures: <list> filled with (node, exception) for every node that could not be counted
+    :return: <AttributeHistogram> of attributes with their occurrences
     """
-    attributes_counter = Counter()
-    x=0
-    for node in nodes:
-        x+=1
-        print(x)
-        try:
-            attributes = node.get_attributes()
-            for attribute in attributes:
-                attributes_set.add(attribute)
-                attributes_counter[attribute] += 1
-        except Exception as e:
-            continue
-    return attributes_counter
+    attributes_histogram = AttributeHistogram()
+    num_nodes = 0
+    num_failed = 0
+    # Enough nodes for every worker to send one PV-pair query at a time
+    chunk_size = dataset.PV_CHUNK_SIZE * (max_workers or workers.MAX_WORKERS)
+    for chunk in workers.chunked(nodes, chunk_size):
+        num_nodes += len(chunk)
+        Node.prefetch_attributes(chunk, max_workers=max_workers)
+        for node, attributes, e in workers.map_bounded(lambda n: n.get_attributes(), chunk, max_workers):
+            if e is not None:
+                num_failed += 1
+                if failures is not None:
+                    failures.append((node, e))
+                continue
+            attributes_histogram.add(attributes)
+            if attributes_set is not None:
+                attributes_set.update(attributes)
+    if num_failed:
+        logging.warning("Attributes of {} out of {} nodes could not be counted".format(num_failed, num_nodes))
+    return attributes_histogram
 
 def immediate_category_filter(category_nodes):
     """
@@ -54,6 +61,10 @@ def immediate_category_filter(category_nodes):
     :param category_nodes: <list> of <Node>
     :return: <list> of <Node>, with no hierarchy conflict(granularity)
     """
+    if dataset.HIERARCHY is not None:
+        specific = set(dataset.HIERARCHY.most_specific([node.uuid for node in category_nodes]))
+        return [node for node in category_nodes if node.uuid in specific]
+
     origin = category_nodes[:]
     result = category_nodes[:]
 
@@ -62,72 +73,140 @@ def immediate_category_filter(category_nodes):
         result = list(set(result) - (set(result) & set(cur_cate)))
     return result
 
-def extract(target_uuid, output_filename, ALPHA):
+def infer_attributes(siblings_histogram, num_siblings, ALPHA):
+    """
+    Keep the attributes shared by more than ALPHA of the siblings.
+    :param siblings_histogram: <AttributeHistogram> of the siblings
+    :param num_siblings: number of siblings
+    :return: <set> of attributes
+    """
+    # The threshold is applied on the whole count array at once
+    return siblings_histogram.select(num_siblings * ALPHA)
+
+def extract(target_uuid, output_filename, ALPHA, max_workers=None, sampling=False, trace_filename=None,
+            result_writer=None, histograms=None):
     """
     Extract the properties from the target entity.
     :param target_uuid: uuid of target_uuid
+    :param output_filename: file the result is appended to, in the format given by its extension (see writer.py)
+    :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+    :param sampling: infer from a random sample of siblings instead of all of them,
+        with the confidence and error configured in sampling.py
+    :param trace_filename: file every query of this extraction is traced to as JSON
+    :param result_writer: <ResultWriter> kept open by the caller, used instead of output_filename if given
+    :param histograms: <HistogramStore> whose histograms of the parents are merged instead of counting
+        the siblings, when every parent is materialized (see materialized.py)
+    :return: <Metrics> of the queries sent, per stage
     """
 
-    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
-    logging.root.setLevel(level=logging.INFO)
-
-    target_node = id2node(target_uuid)
-    logging.info("Extracting common sense knowledge for {}".format(target_node.get_name()))
-
-    #Get the parents node for this entity
-    parents = target_node.get_parents()
-    num_parents = len(parents)
-    logging.info("{} has {} parents: {}".format(
-        target_node.get_name(),
-        num_parents,
-        ", ".join([p.get_name() for p in parents])
-    ))
-
-    siblings = target_node.get_siblings()
-    num_siblings = len(siblings)
-    logging.info("Total number of siblings: {}".format(num_siblings))
-
-    #Count the number of every attribute of siblings
-    siblings_attributes = set()
-    siblings_attributes_counter = count_nodes_attributes(siblings, siblings_attributes)
-
-    target_attributes=set()
-    # Inherit from parent
-    # But there are no need to get this properties.
-    # for p in parents:
-    #     p_attr = p.get_attributes()
-    #     target_attributes.update(p_attr)
-
-    threshold = num_siblings * ALPHA
-
-    # Inference from sibling
-    for a in siblings_attributes:
-        if siblings_attributes_counter[a] > threshold:
-            # This attribute is valid
-            target_attributes.add(a)
-
-    #For validation test
-    # f=open("siblings.txt","a",encoding='utf-8')
-    # f.write(target_node.uuid+"\n")
-    # for x in siblings:
-    #     f.write(str(x.uuid)+"\n")
-    # f.write("\n")
-
-    #Validation
-    target_attributes = validator.validate(target_node, target_attributes)
-
-    # Show the result
-    f=open(output_filename,"a",encoding='utf-8')
-    f.write(target_node.uuid+"\n")
-    for x in target_attributes:
-        f.write(str(x)+"\n")
-    f.write("\n")
-
+    extract_metrics = metrics.Metrics(keep_events=trace_filename is not None)
+    previous_metrics = metrics.activate(extract_metrics)
+    try:
+        target_node = id2node(target_uuid)
+
+        #Get the parents node for this entity
+        with extract_metrics.stage("parents"):
+            parents = target_node.get_parents()
+            num_parents = len(parents)
+        if logging.root.isEnabledFor(logging.INFO):
+            # Every name is resolved by one bulk lookup, apart from the stages of the extraction
+            with extract_metrics.stage("labels"):
+                names = dataset.get_labels([target_node.uuid] + [p.uuid for p in parents])
+            logging.info("Extracting common sense knowledge for {}".format(names[target_node.uuid]))
+            logging.info("{} has {} parents: {}".format(
+                names[target_node.uuid],
+                num_parents,
+                ", ".join([names[p.uuid] for p in parents])
+            ))
+
+        merged = None
+        if histograms is not None:
+            with extract_metrics.stage("counting"):
+                merged = histograms.merged([p.uuid for p in parents])
+            if merged is None:
+                logging.info("Not every parent is materialized, counting the siblings instead")
+
+        if merged is not None:
+            # Inference from the materialized histograms, an entity is counted once per parent it is member of
+            with extract_metrics.stage("counting"):
+                num_members, parents_histogram = merged
+                target_attributes = infer_attributes(parents_histogram, num_members, ALPHA)
+                # Siblings are only counted by the store, never enumerated
+                parent_ids = [p.uuid for p in parents]
+                support = histograms.support(parent_ids, target_attributes)
+                num_siblings = histograms.count_members(parent_ids)
+                scored_siblings = None
+            logging.info("Merged the histograms of {} parents, {} members".format(num_parents, num_members))
+        elif sampling:
+            with extract_metrics.stage("siblings"):
+                siblings = target_node.get_siblings(max_workers)
+            logging.info("Total number of siblings: {}".format(len(siblings)))
+
+            # Inference from a sample of siblings
+            with extract_metrics.stage("counting"):
+                target_attributes, scored_siblings, support = sampling_module.sample_attributes(
+                    siblings, ALPHA, max_workers=max_workers)
+                num_siblings = len(scored_siblings)
+        else:
+            # Inherit from parent
+            # But there are no need to get this properties.
+            # for p in parents:
+            #     p_attr = p.get_attributes()
+            #     target_attributes.update(p_attr)
+
+            #Count the number of every attribute of siblings, while their member pages are still streamed,
+            #the member queries being recorded in the "siblings" stage
+            with extract_metrics.stage("counting"):
+                failures = []
+                siblings = target_node.iter_siblings(max_workers)
+                siblings_histogram = count_nodes_attributes(siblings, None, max_workers, failures)
+                scored_siblings = target_node.siblings
+                num_siblings = len(scored_siblings)
+            logging.info("Counted attributes of {} out of {} siblings".format(num_siblings - len(failures), num_siblings))
+
+            # Inference from sibling, the threshold only counts the siblings whose attributes are known
+            target_attributes = infer_attributes(siblings_histogram, num_siblings - len(failures), ALPHA)
+            # Only the counts of the attributes kept are needed, by the validator and the output
+            support = {x: siblings_histogram[x] for x in target_attributes}
+
+        #For validation test
+        # f=open("siblings.txt","a",encoding='utf-8')
+        # f.write(target_node.uuid+"\n")
+        # for x in siblings:
+        #     f.write(str(x.uuid)+"\n")
+        # f.write("\n")
+
+        #Validation, split in the "multiplicity" and "validation" stages by the validator
+        scores = {}
+        target_attributes = validator.validate(
+            target_node, target_attributes, support, scored_siblings, scores, num_siblings)
+
+        # Show the result
+        with extract_metrics.stage("output"):
+            support = {x: support.get(x, 0) for x in target_attributes}
+            if result_writer is not None:
+                result_writer.write(target_node.uuid, target_attributes, support, num_siblings, scores)
+            else:
+                with writer.ResultWriter(output_filename) as w:
+                    w.write(target_node.uuid, target_attributes, support, num_siblings, scores)
+    finally:
+        metrics.activate(previous_metrics)
+
+    logging.info("Node registry: {}".format(dbnode.registry.stats()))
+    for (kind, target), stats in scheduler.stats().items():
+        logging.info("Scheduler {} {}: {}".format(kind, target, stats))
+    for name, stats in extract_metrics.summary()["stages"].items():
+        logging.info("Stage {}: {:.3f}s wall, {} queries ({} cached), {:.3f}s in queries, {} rows, {} bytes".format(
+            name, stats["wall"], stats["calls"], stats["cached"], stats["latency"], stats["rows"], stats["bytes"]))
+    if trace_filename is not None:
+        extract_metrics.write_trace(trace_filename)
     logging.info("Extract successfully!")
+    return extract_metrics
 
 if __name__ == '__main__':
-    # logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
-    # logging.root.setLevel(level=logging.INFO)
+    # The level is left to the caller when extract() is imported, labels are only resolved for INFO
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.INFO)
 
     #device
     #extract("http://dbpedia.org/resource/Huawei_P9")
@@ -0,0 +1,355 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import bz2
+import gzip
+import logging
+import os
+
+import numpy
+
+import triplestore
+
+__author__ = "Sephirothxlx"
+
+RDFS_SUBCLASSOF = triplestore.RDFS_SUBCLASSOF
+SKOS_BROADER = "http://www.w3.org/2004/02/skos/core#broader"
+
+#Properties linking a class or a category to its parent
+HIERARCHY_PROPERTIES = (RDFS_SUBCLASSOF, SKOS_BROADER)
+
+def edges_from_store(store):
+    """
+    Get the hierarchy edges of a triple store.
+    :param store: <TripleStore>
+    :return: generator of (child uuid, parent uuid)
+    """
+    for predicate in HIERARCHY_PROPERTIES:
+        p = store.terms.lookup(predicate)
+        if p is None:
+            continue
+        for o, subjects in store.pos.get(p, {}).items():
+            for s in subjects:
+                yield store.terms.decode(s), store.terms.decode(o)
+
+def edges_from_dump(*filenames):
+    """
+    Stream the hierarchy edges of N-Triples dumps without loading them in a store,
+    e.g. the DBpedia ontology, the YAGO taxonomy and the SKOS categories dumps.
+    :param filenames: paths of the dumps, optionally gzip or bzip2 compressed
+    :return: generator of (child uuid, parent uuid)
+    """
+    for filename in filenames:
+        if filename.endswith(".gz"):
+            f = gzip.open(filename, "rt", encoding="utf-8")
+        elif filename.endswith(".bz2"):
+            f = bz2.open(filename, "rt", encoding="utf-8")
+        else:
+            f = open(filename, "r", encoding="utf-8")
+        with f:
+            for line in f:
+                match = triplestore.NTRIPLE_PATTERN.match(line)
+                if match is None or match.group(2)[1:-1] not in HIERARCHY_PROPERTIES:
+                    continue
+                if not match.group(3).startswith("<"):
+                    continue
+                yield match.group(1)[1:-1], match.group(3)[1:-1]
+
+def _strongly_connected_components(num_nodes, parents):
+    """
+    Tarjan's algorithm, iterative. Components are returned parents first,
+    i.e. every component comes after all the components it reaches.
+    :param num_nodes: number of nodes
+    :param parents: <list> of <list> of parent ids per node
+    :return: <list> of <list> of node ids
+    """
+    index = [-1] * num_nodes
+    lowlink = [0] * num_nodes
+    on_stack = [False] * num_nodes
+    stack = []
+    components = []
+    counter = 0
+    for root in range(num_nodes):
+        if index[root] != -1:
+            continue
+        work = [(root, 0)]
+        while work:
+            node, i = work.pop()
+            if i == 0:
+                index[node] = lowlink[node] = counter
+                counter += 1
+                stack.append(node)
+                on_stack[node] = True
+            recurse = False
+            for j in range(i, len(parents[node])):
+                parent = parents[node][j]
+                if index[parent] == -1:
+                    work.append((node, j + 1))
+                    work.append((parent, 0))
+                    recurse = True
+                    break
+                if on_stack[parent]:
+                    lowlink[node] = min(lowlink[node], index[parent])
+            if recurse:
+                continue
+            if lowlink[node] == index[node]:
+                component = []
+                while True:
+                    member = stack.pop()
+                    on_stack[member] = False
+                    component.append(member)
+                    if member == node:
+                        break
+                components.append(component)
+            if work:
+                caller = work[-1][0]
+                lowlink[caller] = min(lowlink[caller], lowlink[node])
+    return components
+
+def _merge_intervals(intervals):
+    """
+    :param intervals: <list> of (start, end), bounds included
+    :return: <list> of disjoint (start, end) sorted by start, adjacent intervals joined
+    """
+    intervals.sort()
+    merged = [list(intervals[0])]
+    for start, end in intervals[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [tuple(interval) for interval in merged]
+
+def _csr(lists, dtype):
+    """
+    :param lists: <list> of <list> of ints
+    :return: (offsets, values) <numpy.ndarray>, values[offsets[i]:offsets[i + 1]] being lists[i]
+    """
+    offsets = numpy.zeros(len(lists) + 1, dtype=numpy.int64)
+    offsets[1:] = numpy.cumsum([len(values) for values in lists])
+    values = numpy.fromiter((v for values in lists for v in values), dtype=dtype, count=int(offsets[-1]))
+    return offsets, values
+
+class Hierarchy(object):
+    """
+    Transitive closure of the class and category hierarchy, compressed by interval labelling.
+    Cycles are collapsed into components, and the components are numbered in postorder along a
+    spanning forest of the hierarchy, from the roots down. The descendants of a component are then
+    a few intervals of numbers: the one of its subtree, merged with those of the children it does
+    not hold in the forest. A term is an ancestor of another if the number of the other falls in
+    one of its intervals. Memory grows with the edges and intervals, never with the sum of the
+    closures, and every array is saved to disk and memory-mapped on load.
+    """
+
+    #Arrays of the index, all saved as <name>.npy
+    ARRAYS = (
+        "component",  # component id of every term
+        "post",  # postorder number of every component
+        "interval_offsets", "interval_starts", "interval_ends",  # descendant intervals of every component
+        "parent_offsets", "parents",  # parent components of every component
+        "member_offsets", "members",  # terms of every component
+    )
+
+    def __init__(self, terms, arrays):
+        """
+        :param terms: <list> of uuid, the position of a uuid is its id
+        :param arrays: <dict> of {name: <numpy.ndarray>} for every name of ARRAYS
+        """
+        self.terms = terms
+        self.term2id = {term: i for i, term in enumerate(terms)}
+        self.arrays = arrays
+        for name in self.ARRAYS:
+            setattr(self, name, arrays[name])
+
+    @staticmethod
+    def build(edges):
+        """
+        Compute the interval labels of a hierarchy, cycles included.
+        :param edges: iterable of (child uuid, parent uuid)
+        :return: <Hierarchy>
+        """
+        terms = triplestore.TermDictionary()
+        parents = []
+        for child, parent in edges:
+            c = terms.encode(child)
+            p = terms.encode(parent)
+            while len(parents) < len(terms):
+                parents.append([])
+            if c != p:
+                parents[c].append(p)
+        num_nodes = len(terms)
+
+        components = _strongly_connected_components(num_nodes, parents)
+        num_components = len(components)
+        component_of = [0] * num_nodes
+        for i, component in enumerate(components):
+            for node in component:
+                component_of[node] = i
+        component_parents = [set() for _ in range(num_components)]
+        component_children = [[] for _ in range(num_components)]
+        for node in range(num_nodes):
+            i = component_of[node]
+            for parent in parents[node]:
+                j = component_of[parent]
+                if j != i and j not in component_parents[i]:
+                    component_parents[i].add(j)
+                    component_children[j].append(i)
+        del parents
+
+        # Postorder numbers along a spanning forest, walked down from the roots;
+        # the subtree of a component holds the numbers from low to its own
+        post = [-1] * num_components
+        low = [0] * num_components
+        counter = 0
+        for root in range(num_components):
+            if component_parents[root] or post[root] != -1:
+                continue
+            post[root] = -2  # visited
+            low[root] = counter
+            stack = [(root, iter(component_children[root]))]
+            while stack:
+                component, children = stack[-1]
+                for child in children:
+                    if post[child] == -1:
+                        post[child] = -2
+                        low[child] = counter
+                        stack.append((child, iter(component_children[child])))
+                        break
+                else:
+                    stack.pop()
+                    post[component] = counter
+                    counter += 1
+
+        # Children come last in components, so walking it backwards labels them first
+        intervals = [None] * num_components
+        for i in range(num_components - 1, -1, -1):
+            own = [(low[i], post[i])]
+            for child in component_children[i]:
+                own.extend(intervals[child])
+            intervals[i] = _merge_intervals(own)
+
+        interval_offsets, starts = _csr([[start for start, _ in labels] for labels in intervals], numpy.int32)
+        ends = numpy.fromiter((end for labels in intervals for _, end in labels), dtype=numpy.int32, count=len(starts))
+        parent_offsets, parent_components = _csr([sorted(p) for p in component_parents], numpy.int32)
+        member_offsets, members = _csr([sorted(c) for c in components], numpy.int32)
+        return Hierarchy(terms.id2term, {
+            "component": numpy.array(component_of, dtype=numpy.int32),
+            "post": numpy.array(post, dtype=numpy.int32),
+            "interval_offsets": interval_offsets,
+            "interval_starts": starts,
+            "interval_ends": ends,
+            "parent_offsets": parent_offsets,
+            "parents": parent_components,
+            "member_offsets": member_offsets,
+            "members": members,
+        })
+
+    def save(self, directory):
+        """
+        Write the index to a directory.
+        :param directory: path, created if needed
+        """
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(os.path.join(directory, "terms.txt"), "w", encoding="utf-8") as f:
+            for term in self.terms:
+                f.write(term + "\n")
+        for name in self.ARRAYS:
+            numpy.save(os.path.join(directory, name + ".npy"), self.arrays[name])
+
+    @staticmethod
+    def load(directory):
+        """
+        Read an index written by save(), memory-mapping its arrays.
+        :param directory: path
+        :return: <Hierarchy>
+        """
+        with open(os.path.join(directory, "terms.txt"), "r", encoding="utf-8") as f:
+            terms = [line.rstrip("\n") for line in f]
+        arrays = {name: numpy.load(os.path.join(directory, name + ".npy"), mmap_mode="r") for name in Hierarchy.ARRAYS}
+        return Hierarchy(terms, arrays)
+
+    def __len__(self):
+        return len(self.terms)
+
+    def __contains__(self, uuid):
+        return uuid in self.term2id
+
+    def _members(self, c):
+        return self.members[self.member_offsets[c]:self.member_offsets[c + 1]]
+
+    def _is_descendant_component(self, c, d):
+        # Whether the postorder number of component d falls in one of the intervals of component c
+        starts = self.interval_starts[self.interval_offsets[c]:self.interval_offsets[c + 1]]
+        ends = self.interval_ends[self.interval_offsets[c]:self.interval_offsets[c + 1]]
+        k = numpy.searchsorted(starts, self.post[d], side="right") - 1
+        return k >= 0 and ends[k] >= self.post[d]
+
+    def ancestors(self, uuid):
+        """
+        :param uuid: uuid of a class or category
+        :return: <list> of uuid of all its ancestors, itself included if it is in a cycle
+        """
+        i = self.term2id.get(uuid)
+        if i is None:
+            return []
+        start = int(self.component[i])
+        # The ancestors are not stored, the parent components are walked up instead
+        seen = {start}
+        stack = [start]
+        while stack:
+            c = stack.pop()
+            for parent in self.parents[self.parent_offsets[c]:self.parent_offsets[c + 1]]:
+                parent = int(parent)
+                if parent not in seen:
+                    seen.add(parent)
+                    stack.append(parent)
+        if len(self._members(start)) == 1:
+            seen.discard(start)
+        return [self.terms[j] for j in sorted(int(j) for c in seen for j in self._members(c))]
+
+    def is_ancestor(self, ancestor, descendant):
+        """
+        Check if a class or category is above another one in the hierarchy.
+        :param ancestor: uuid
+        :param descendant: uuid
+        :return: <bool>
+        """
+        a = self.term2id.get(ancestor)
+        d = self.term2id.get(descendant)
+        if a is None or d is None:
+            return False
+        ca = self.component[a]
+        cd = self.component[d]
+        if ca == cd:
+            # Members of a cycle are ancestors of each other and of themselves
+            return len(self._members(ca)) > 1
+        return bool(self._is_descendant_component(ca, cd))
+
+    def most_specific(self, uuids):
+        """
+        Keep only the classes or categories that are not an ancestor of another one of the list.
+        Members of a same cycle are all kept.
+        :param uuids: <list> of uuid
+        :return: <list> of uuid
+        """
+        uuids = list(uuids)
+        return [
+            u for u in uuids
+            if not any(v != u and self.is_ancestor(u, v) and not self.is_ancestor(v, u) for v in uuids)
+        ]
+
+if __name__ == '__main__':
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Build the hierarchy index from N-Triples dumps.")
+    parser.add_argument("output", help="directory the index is written to")
+    parser.add_argument("dumps", nargs="+", help="dumps with rdfs:subClassOf and skos:broader triples")
+    args = parser.parse_args()
+
+    hierarchy = Hierarchy.build(edges_from_dump(*args.dumps))
+    hierarchy.save(args.output)
+    logging.info("Saved the interval labels of {} classes and categories ({} intervals) to {}".format(
+        len(hierarchy), len(hierarchy.interval_starts), args.output))
@@ -0,0 +1,151 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+
+import numpy
+
+from triplestore import TermDictionary
+
+__author__ = "Sephirothxlx"
+
+def pack_attribute(attribute, terms):
+    """
+    Encode a (property, value) pair into one integer key.
+    :param attribute: (property, value)
+    :param terms: <TermDictionary> the property and value are interned into
+    :return: <int> with the property id in the high 32 bits and the value id in the low 32 bits
+    """
+    return (terms.encode(attribute[0]) << 32) | terms.encode(attribute[1])
+
+def unpack_attribute(key, terms):
+    """
+    Decode an integer key back into its (property, value) pair.
+    :param key: <int> built by pack_attribute()
+    :param terms: <TermDictionary> the key was packed with
+    :return: (property, value)
+    """
+    key = int(key)
+    return terms.decode(key >> 32), terms.decode(key & 0xFFFFFFFF)
+
+class AttributeHistogram(object):
+    """
+    Occurrences of attributes over a set of nodes, counted on packed integer keys.
+    Keys and counts are kept as sorted NumPy arrays, strings are only decoded on output.
+    Every histogram interns its terms in its own dictionary unless one is given, so they are
+    released with the histogram instead of growing for the whole process.
+    """
+
+    def __init__(self, terms=None):
+        """
+        :param terms: <TermDictionary> shared with other histograms, a new one if not given
+        """
+        self.terms = TermDictionary() if terms is None else terms
+        self._keys = numpy.empty(0, dtype=numpy.int64)
+        self._counts = numpy.empty(0, dtype=numpy.int64)
+        self._pending = []
+
+    @classmethod
+    def from_items(cls, items, terms=None):
+        """
+        Build a histogram from counts computed beforehand, e.g. stored by checkpoint.py.
+        :param items: iterable of ((property, value), occurrences)
+        :param terms: <TermDictionary> shared with other histograms, a new one if not given
+        :return: <AttributeHistogram>
+        """
+        histogram = cls(terms)
+        terms = histogram.terms
+        keys = []
+        counts = []
+        for attribute, count in items:
+            keys.append(pack_attribute(attribute, terms))
+            counts.append(count)
+        histogram._pending.append((numpy.array(keys, dtype=numpy.int64), numpy.array(counts, dtype=numpy.int64)))
+        return histogram
+
+    def add(self, attributes):
+        """
+        Count the attributes of one node.
+        :param attributes: iterable of (property, value), each counted once
+        """
+        keys = {pack_attribute(a, self.terms) for a in attributes}
+        keys = numpy.fromiter(keys, dtype=numpy.int64, count=len(keys))
+        self._pending.append((keys, numpy.ones(len(keys), dtype=numpy.int64)))
+
+    def update(self, other, weight=1):
+        """
+        Add the counts of another histogram.
+        :param other: <AttributeHistogram>, its keys are translated unless it shares the same terms
+        :param weight: <int> the counts are multiplied by, -1 to subtract them
+        """
+        keys = other.keys()
+        if other.terms is not self.terms and len(keys):
+            # Every term used by the other histogram is interned once, then its keys are remapped at once
+            high = keys >> 32
+            low = keys & 0xFFFFFFFF
+            used = numpy.unique(numpy.concatenate([high, low]))
+            ids = numpy.array([self.terms.encode(other.terms.decode(int(i))) for i in used], dtype=numpy.int64)
+            keys = (ids[numpy.searchsorted(used, high)] << 32) | ids[numpy.searchsorted(used, low)]
+        self._pending.append((keys, other.counts() * weight))
+
+    def _merge(self):
+        if not self._pending:
+            return
+        keys = numpy.concatenate([self._keys] + [k for k, _ in self._pending])
+        weights = numpy.concatenate([self._counts] + [c for _, c in self._pending])
+        self._pending = []
+        self._keys, inverse = numpy.unique(keys, return_inverse=True)
+        self._counts = numpy.bincount(inverse, weights=weights, minlength=len(self._keys)).astype(numpy.int64)
+        if weights.min(initial=0) < 0:
+            # Attributes whose counts were all subtracted are dropped
+            kept = self._counts != 0
+            self._keys = self._keys[kept]
+            self._counts = self._counts[kept]
+
+    def keys(self):
+        """
+        :return: sorted <numpy.ndarray> of packed attribute keys
+        """
+        self._merge()
+        return self._keys
+
+    def counts(self):
+        """
+        :return: <numpy.ndarray> of occurrences, aligned with keys()
+        """
+        self._merge()
+        return self._counts
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __iter__(self):
+        for key in self.keys():
+            yield unpack_attribute(key, self.terms)
+
+    def __getitem__(self, attribute):
+        p = self.terms.lookup(attribute[0])
+        o = self.terms.lookup(attribute[1])
+        if p is None or o is None:
+            return 0
+        keys = self.keys()
+        key = (p << 32) | o
+        i = numpy.searchsorted(keys, key)
+        if i < len(keys) and keys[i] == key:
+            return int(self._counts[i])
+        return 0
+
+    def select(self, threshold):
+        """
+        Get the attributes occurring more than threshold times.
+        :param threshold: <float>
+        :return: <set> of (property, value)
+        """
+        chosen = self.keys()[self.counts() > threshold]
+        return {unpack_attribute(key, self.terms) for key in chosen}
+
+    def to_counter(self):
+        """
+        :return: <Counter> of (property, value) with their occurrences
+        """
+        return Counter({unpack_attribute(k, self.terms): int(c) for k, c in zip(self.keys(), self.counts())})
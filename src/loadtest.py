@@ -0,0 +1,112 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import http.client
+import json
+import socket
+import threading
+import time
+
+import batch
+import workers
+
+__author__ = "Sephirothxlx"
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """
+    HTTP connection over a Unix socket, for a service started with --unix.
+    """
+
+    def __init__(self, path, timeout=None):
+        http.client.HTTPConnection.__init__(self, "localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def run(targets, num_requests, concurrency, ALPHA=0.5, host="127.0.0.1", port=8080, unix_path=None, timeout=600):
+    """
+    Send extraction requests to a running service, cycling through the targets,
+    from concurrency clients each keeping its connection alive.
+    :param targets: <list> of uuid
+    :param num_requests: total number of requests
+    :param concurrency: number of clients sending requests at once
+    :return: <dict> of throughput, latency percentiles and errors
+    """
+    local = threading.local()
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+
+    def connection():
+        if getattr(local, "connection", None) is None:
+            if unix_path is not None:
+                local.connection = UnixHTTPConnection(unix_path, timeout)
+            else:
+                local.connection = http.client.HTTPConnection(host, port, timeout=timeout)
+        return local.connection
+
+    def send(i):
+        body = json.dumps({"uri": targets[i % len(targets)], "alpha": ALPHA})
+        start = time.time()
+        try:
+            c = connection()
+            c.request("POST", "/extract", body, {"Content-Type": "application/json"})
+            response = c.getresponse()
+            data = response.read()
+            if response.status != 200:
+                raise RuntimeError("{} {}".format(response.status, data[:200]))
+        except Exception as e:
+            local.connection = None
+            with lock:
+                errors.append(str(e))
+            return
+        with lock:
+            latencies.append(time.time() - start)
+
+    start = time.time()
+    workers.map_bounded(send, range(num_requests), concurrency)
+    elapsed = time.time() - start
+    return {
+        "requests": num_requests,
+        "errors": len(errors),
+        "seconds": elapsed,
+        "requests_per_second": num_requests / elapsed if elapsed else None,
+        "p50": _percentile(latencies, 0.5),
+        "p90": _percentile(latencies, 0.9),
+        "p99": _percentile(latencies, 0.99),
+        "first_errors": errors[:5],
+    }
+
+def health(host="127.0.0.1", port=8080, unix_path=None):
+    """
+    :return: <dict> returned by the /health endpoint of the service
+    """
+    c = UnixHTTPConnection(unix_path) if unix_path is not None else http.client.HTTPConnection(host, port)
+    c.request("GET", "/health")
+    return json.loads(c.getresponse().read().decode("utf-8"))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Load test a running extraction service.")
+    parser.add_argument("targets", help="file with one target uuid per line")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--alpha", type=float, default=0.5)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--unix", help="path of the Unix socket of the service")
+    args = parser.parse_args()
+
+    result = run(batch.read_targets(args.targets), args.requests, args.concurrency, args.alpha,
+                 args.host, args.port, args.unix)
+    print(json.dumps(result, indent=1))
+    print(json.dumps(health(args.host, args.port, args.unix)["counts"]))
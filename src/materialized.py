@@ -0,0 +1,373 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import batch
+import dataset
+import extractor
+from histogram import AttributeHistogram
+import triplestore
+import workers
+
+__author__ = "Sephirothxlx"
+
+TYPE = "type"
+CATEGORY = "category"
+
+#Attributes counted by one query of HistogramStore.support(), two SQLite parameters each
+SUPPORT_CHUNK_SIZE = 200
+
+def fetch_attributes(entity_ids, max_workers=None):
+    """
+    Get the attributes of many entities, the same as <Node>.get_attributes() without the node cache.
+    :param entity_ids: <list> of uuid
+    :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+    :return: <dict> of {entity_id: <set> of (property, value)}
+    """
+    chunks = list(workers.chunked(entity_ids, dataset.PV_CHUNK_SIZE))
+    attributes = {}
+    for chunk, pv_pairs, e in workers.map_bounded(dataset.get_pv_pairs_many, chunks, max_workers):
+        if e is not None:
+            raise e
+        for entity_id in chunk:
+            attributes[entity_id] = set(pv_pairs.get(entity_id, []) + dataset.get_csks(entity_id))
+    return attributes
+
+class HistogramStore(object):
+    """
+    Materialized attribute histograms of types and categories, stored in SQLite.
+    Every class keeps its members and, for every attribute, the number of members having it.
+    The attributes of every member are kept once, so that adding, removing or refreshing
+    members only updates the counts they change.
+    Values are stored with triplestore.dump_term(), which keeps literals apart from IRIs.
+    """
+
+    def __init__(self, filename):
+        """
+        :param filename: path of the SQLite file
+        """
+        self.filename = filename
+        self._lock = threading.Lock()
+        self._conn = None
+
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.filename)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            self._conn = sqlite3.connect(self.filename, check_same_thread=False)
+            self._conn.executescript("""
+                CREATE TABLE IF NOT EXISTS classes (
+                    class TEXT PRIMARY KEY,
+                    kind TEXT NOT NULL,
+                    members INTEGER NOT NULL,
+                    updated REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS members (
+                    class TEXT NOT NULL,
+                    entity TEXT NOT NULL,
+                    PRIMARY KEY (class, entity)
+                );
+                CREATE INDEX IF NOT EXISTS members_entity ON members (entity);
+                CREATE TABLE IF NOT EXISTS entity_attributes (
+                    entity TEXT NOT NULL,
+                    property TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    PRIMARY KEY (entity, property, value)
+                );
+                CREATE INDEX IF NOT EXISTS entity_attributes_pv ON entity_attributes (property, value);
+                CREATE TABLE IF NOT EXISTS support (
+                    class TEXT NOT NULL,
+                    property TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    count INTEGER NOT NULL,
+                    PRIMARY KEY (class, property, value)
+                );
+            """)
+            self._conn.commit()
+        return self._conn
+
+    def __contains__(self, class_id):
+        with self._lock:
+            return self._connect().execute(
+                "SELECT 1 FROM classes WHERE class = ?", (class_id,)).fetchone() is not None
+
+    def classes(self):
+        """
+        :return: <dict> of {class uuid: (kind, number of members)}
+        """
+        with self._lock:
+            rows = self._connect().execute("SELECT class, kind, members FROM classes").fetchall()
+        return {row[0]: (row[1], row[2]) for row in rows}
+
+    def _stored_attributes(self, conn, entity_ids):
+        attributes = {entity_id: set() for entity_id in entity_ids}
+        for entity_id in entity_ids:
+            for p, v in conn.execute(
+                    "SELECT property, value FROM entity_attributes WHERE entity = ?", (entity_id,)):
+                attributes[entity_id].add((p, triplestore.load_term(v)))
+        return attributes
+
+    def _apply(self, conn, class_id, attributes, sign):
+        counts = {}
+        for entity_attributes in attributes:
+            for attribute in entity_attributes:
+                counts[attribute] = counts.get(attribute, 0) + sign
+        conn.executemany(
+            "INSERT INTO support (class, property, value, count) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (class, property, value) DO UPDATE SET count = count + excluded.count",
+            [(class_id, p, triplestore.dump_term(v), c) for (p, v), c in counts.items()])
+
+    def _update_class(self, conn, class_id, kind):
+        conn.execute("DELETE FROM support WHERE class = ? AND count <= 0", (class_id,))
+        n = conn.execute("SELECT COUNT(*) FROM members WHERE class = ?", (class_id,)).fetchone()[0]
+        conn.execute(
+            "INSERT INTO classes (class, kind, members, updated) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (class) DO UPDATE SET members = excluded.members, updated = excluded.updated",
+            (class_id, kind, n, time.time()))
+
+    def add_members(self, class_id, kind, entity_ids, max_workers=None):
+        """
+        Count new members of a class, fetching their attributes. The stored attributes of the entities
+        already member of another class are replaced, and the counts of those classes updated.
+        :param class_id: uuid of the type or category
+        :param kind: TYPE or CATEGORY
+        :param entity_ids: iterable of uuid
+        :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+        """
+        with self._lock:
+            conn = self._connect()
+            entity_ids = [e for e in dict.fromkeys(entity_ids) if conn.execute(
+                "SELECT 1 FROM members WHERE class = ? AND entity = ?", (class_id, e)).fetchone() is None]
+        fetched = fetch_attributes(entity_ids, max_workers)
+        with self._lock:
+            conn = self._connect()
+            # Entities already member of another class have their attributes stored, maybe outdated
+            known = {e for e in entity_ids if conn.execute(
+                "SELECT 1 FROM members WHERE entity = ? LIMIT 1", (e,)).fetchone() is not None}
+            self._replace_attributes(conn, {e: fetched[e] for e in known})
+            conn.executemany("INSERT OR IGNORE INTO entity_attributes (entity, property, value) VALUES (?, ?, ?)",
+                             [(e, p, triplestore.dump_term(v)) for e in entity_ids if e not in known
+                              for p, v in fetched[e]])
+            conn.executemany("INSERT INTO members (class, entity) VALUES (?, ?)", [(class_id, e) for e in entity_ids])
+            self._apply(conn, class_id, fetched.values(), 1)
+            self._update_class(conn, class_id, kind)
+            conn.commit()
+
+    def remove_members(self, class_id, entity_ids):
+        """
+        Stop counting members of a class.
+        :param class_id: uuid of the type or category
+        :param entity_ids: iterable of uuid
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT kind FROM classes WHERE class = ?", (class_id,)).fetchone()
+            if row is None:
+                return
+            entity_ids = [e for e in dict.fromkeys(entity_ids) if conn.execute(
+                "SELECT 1 FROM members WHERE class = ? AND entity = ?", (class_id, e)).fetchone() is not None]
+            attributes = self._stored_attributes(conn, entity_ids)
+            conn.executemany("DELETE FROM members WHERE class = ? AND entity = ?", [(class_id, e) for e in entity_ids])
+            self._apply(conn, class_id, attributes.values(), -1)
+            # Attributes of entities left in no class are not needed anymore
+            conn.execute("DELETE FROM entity_attributes WHERE entity NOT IN (SELECT entity FROM members)")
+            self._update_class(conn, class_id, row[0])
+            conn.commit()
+
+    def refresh_class(self, class_id, kind, max_workers=None):
+        """
+        Build the histogram of a class, or bring it up to date with its current members.
+        The attributes of the entities added or removed are fetched again, since a change of membership
+        usually changes them too (rdf:type, dct:subject), and the counts of their other classes updated.
+        :param class_id: uuid of the type or category
+        :param kind: TYPE or CATEGORY
+        :return: (number of members added, number of members removed)
+        """
+        stream = dataset.iter_type_members if kind == TYPE else dataset.iter_category_member
+        current = set(stream(class_id))
+        with self._lock:
+            stored = {row[0] for row in self._connect().execute(
+                "SELECT entity FROM members WHERE class = ?", (class_id,))}
+        added = current - stored
+        removed = stored - current
+        if removed:
+            self.remove_members(class_id, removed)
+            self.refresh_entities(sorted(removed), max_workers)
+        if added or class_id not in self:
+            self.add_members(class_id, kind, sorted(added), max_workers)
+        return len(added), len(removed)
+
+    def _replace_attributes(self, conn, fetched):
+        # Entities member of no class have no attributes stored and are left out
+        old = self._stored_attributes(conn, list(fetched))
+        for entity_id, attributes in fetched.items():
+            added = attributes - old[entity_id]
+            removed = old[entity_id] - attributes
+            if not added and not removed:
+                continue
+            classes = [row[0] for row in conn.execute(
+                "SELECT class FROM members WHERE entity = ?", (entity_id,))]
+            if not classes:
+                continue
+            for class_id in classes:
+                self._apply(conn, class_id, [added], 1)
+                self._apply(conn, class_id, [removed], -1)
+                conn.execute("DELETE FROM support WHERE class = ? AND count <= 0", (class_id,))
+            conn.executemany("DELETE FROM entity_attributes WHERE entity = ? AND property = ? AND value = ?",
+                             [(entity_id, p, triplestore.dump_term(v)) for p, v in removed])
+            conn.executemany("INSERT INTO entity_attributes (entity, property, value) VALUES (?, ?, ?)",
+                             [(entity_id, p, triplestore.dump_term(v)) for p, v in added])
+
+    def refresh_entities(self, entity_ids, max_workers=None):
+        """
+        Fetch the attributes of entities again and update the counts of every class they are member of.
+        :param entity_ids: iterable of uuid of changed entities, those member of no class are skipped
+        :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+        """
+        with self._lock:
+            conn = self._connect()
+            entity_ids = [e for e in dict.fromkeys(entity_ids) if conn.execute(
+                "SELECT 1 FROM members WHERE entity = ? LIMIT 1", (e,)).fetchone() is not None]
+        fetched = fetch_attributes(entity_ids, max_workers)
+        with self._lock:
+            conn = self._connect()
+            self._replace_attributes(conn, fetched)
+            conn.commit()
+
+    def get(self, class_id, terms=None):
+        """
+        :param class_id: uuid of the type or category
+        :param terms: <TermDictionary> the histogram interns its terms into, a new one if not given
+        :return: (number of members, <AttributeHistogram>), None if the class is not materialized
+        """
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT members FROM classes WHERE class = ?", (class_id,)).fetchone()
+            if row is None:
+                return None
+            items = [((p, triplestore.load_term(v)), c) for p, v, c in conn.execute(
+                "SELECT property, value, count FROM support WHERE class = ?", (class_id,))]
+        return row[0], AttributeHistogram.from_items(items, terms)
+
+    def merged(self, class_ids):
+        """
+        Merge the histograms of classes, e.g. the parents of a target.
+        An entity member of several classes is counted once per class.
+        :param class_ids: iterable of uuid of types and categories
+        :return: (number of members, <AttributeHistogram>), None if any class is not materialized
+        """
+        num_members = 0
+        histogram = AttributeHistogram()
+        for class_id in class_ids:
+            stored = self.get(class_id, histogram.terms)
+            if stored is None:
+                return None
+            num_members += stored[0]
+            histogram.update(stored[1])
+        return num_members, histogram
+
+    def count_members(self, class_ids):
+        """
+        :param class_ids: iterable of uuid of types and categories
+        :return: number of distinct members of any of them, counted by SQLite
+        """
+        class_ids = list(class_ids)
+        with self._lock:
+            return self._connect().execute(
+                "SELECT COUNT(DISTINCT entity) FROM members WHERE class IN (%s)" % ", ".join("?" * len(class_ids)),
+                class_ids).fetchone()[0]
+
+    def support(self, class_ids, attributes):
+        """
+        Count the distinct members of classes having every attribute, in one aggregate query per chunk
+        of attributes, as extractor.count_nodes_attributes() counts them on the siblings.
+        :param class_ids: iterable of uuid of types and categories
+        :param attributes: iterable of (property, value)
+        :return: <dict> of {(property, value): number of members having it}, covering every attribute
+        """
+        class_ids = list(class_ids)
+        attributes = list(set(attributes))
+        support = dict.fromkeys(attributes, 0)
+        # Values are looked up by their stored form, which keeps literals apart from IRIs
+        stored = {(p, triplestore.dump_term(v)): (p, v) for p, v in attributes}
+        keys = list(stored)
+        with self._lock:
+            conn = self._connect()
+            for i in range(0, len(keys), SUPPORT_CHUNK_SIZE):
+                chunk = keys[i:i + SUPPORT_CHUNK_SIZE]
+                sql = (
+                    "WITH wanted (property, value) AS (VALUES %s) "
+                    "SELECT a.property, a.value, COUNT(DISTINCT a.entity) FROM wanted w "
+                    "JOIN entity_attributes a ON a.property = w.property AND a.value = w.value "
+                    "JOIN members m ON m.entity = a.entity AND m.class IN (%s) "
+                    "GROUP BY a.property, a.value"
+                ) % (", ".join(["(?, ?)"] * len(chunk)), ", ".join("?" * len(class_ids)))
+                params = [term for key in chunk for term in key] + class_ids
+                for p, v, n in conn.execute(sql, params):
+                    support[stored[(p, v)]] = n
+        return support
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+def materialize_targets(store, targets, max_workers=None):
+    """
+    Build or refresh the histograms of every parent of the targets.
+    :param store: <HistogramStore>
+    :param targets: iterable of uuid
+    :return: <dict> of {class uuid: (number of members added, number of members removed)}
+    """
+    classes = {}
+    for uuid in targets:
+        target_node = extractor.id2node(uuid)
+        target_node.get_parents()
+        classes.update({p.uuid: TYPE for p in target_node.types})
+        classes.update({p.uuid: CATEGORY for p in target_node.categories})
+    changes = {}
+    for class_id, kind in sorted(classes.items()):
+        changes[class_id] = store.refresh_class(class_id, kind, max_workers)
+        logging.info("{} {}: {} members added, {} removed".format(kind, class_id, *changes[class_id]))
+    return changes
+
+if __name__ == '__main__':
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Materialize the attribute histograms of types and categories.")
+    parser.add_argument("store", help="SQLite file of the histograms, updated in place")
+    parser.add_argument("--targets", help="file with one target uuid per line, whose parents are materialized")
+    parser.add_argument("--types", nargs="*", default=[], help="uuid of types to materialize")
+    parser.add_argument("--categories", nargs="*", default=[], help="uuid of categories to materialize")
+    parser.add_argument("--refresh", action="store_true", help="bring every class already stored up to date")
+    parser.add_argument("--refresh-entities", nargs="*", default=[],
+                        help="uuid of entities whose attributes changed, fetched again and recounted in their classes")
+    parser.add_argument("--backend", nargs="*", help="N-Triples dumps read instead of the endpoint")
+    parser.add_argument("--workers", type=int, default=None, help="maximum number of concurrent queries")
+    args = parser.parse_args()
+
+    if args.backend:
+        dataset.use_backend(triplestore.load(*args.backend))
+    store = HistogramStore(args.store)
+    if args.refresh:
+        for class_id, (kind, n) in sorted(store.classes().items()):
+            logging.info("{} {}: {} members added, {} removed".format(
+                kind, class_id, *store.refresh_class(class_id, kind, args.workers)))
+    if args.refresh_entities:
+        store.refresh_entities(args.refresh_entities, args.workers)
+    for class_id in args.types:
+        store.refresh_class(class_id, TYPE, args.workers)
+    for class_id in args.categories:
+        store.refresh_class(class_id, CATEGORY, args.workers)
+    if args.targets:
+        materialize_targets(store, batch.read_targets(args.targets), args.workers)
+    store.close()
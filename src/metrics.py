@@ -0,0 +1,127 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+__author__ = "Sephirothxlx"
+
+_local = threading.local()
+
+def _new_stats():
+    return {"wall": 0.0, "calls": 0, "cached": 0, "latency": 0.0, "rows": 0, "bytes": 0}
+
+class Metrics(object):
+    """
+    Latency, row count and size of every SPARQL and search call, aggregated per pipeline stage
+    and per calling function.
+    """
+
+    def __init__(self, keep_events=False):
+        """
+        :param keep_events: keep every call, needed to write a trace
+        """
+        self.keep_events = keep_events
+        self.events = []
+        self.stages = {}
+        self.functions = {}
+        self.current_stage = None
+        self.start = time.time()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Attribute the calls made inside the block to a stage and measure its wall time.
+        :param name: <str> name of the stage
+        """
+        previous = self.current_stage
+        self.current_stage = name
+        start = time.time()
+        try:
+            yield self
+        finally:
+            elapsed = time.time() - start
+            self.current_stage = previous
+            with self._lock:
+                self.stages.setdefault(name, _new_stats())["wall"] += elapsed
+
+    def record(self, kind, function, latency, rows=None, size=None, cached=False):
+        """
+        Record one call.
+        :param kind: "sparql" or "search"
+        :param function: <str> name of the calling function or engine
+        :param latency: seconds spent in the call
+        :param rows: number of rows returned
+        :param size: number of bytes received
+        :param cached: whether the result came from a cache
+        """
+        stage = self.current_stage or "other"
+        with self._lock:
+            for stats in (self.stages.setdefault(stage, _new_stats()),
+                          self.functions.setdefault(kind + ":" + function, _new_stats())):
+                stats["calls"] += 1
+                stats["cached"] += 1 if cached else 0
+                stats["latency"] += latency
+                stats["rows"] += rows or 0
+                stats["bytes"] += size or 0
+            if self.keep_events:
+                self.events.append({
+                    "time": time.time() - self.start,
+                    "stage": stage,
+                    "kind": kind,
+                    "function": function,
+                    "latency": latency,
+                    "rows": rows,
+                    "bytes": size,
+                    "cached": cached,
+                })
+
+    def summary(self):
+        """
+        :return: <dict> of totals per stage and per function
+        """
+        with self._lock:
+            return {
+                "wall": time.time() - self.start,
+                "stages": {name: dict(stats) for name, stats in self.stages.items()},
+                "functions": {name: dict(stats) for name, stats in self.functions.items()},
+            }
+
+    def write_trace(self, filename):
+        """
+        Write the summary and every recorded call as JSON.
+        :param filename: path of the trace file
+        """
+        trace = self.summary()
+        with self._lock:
+            trace["events"] = list(self.events)
+        with open(filename, "w", encoding="utf-8") as f:
+            json.dump(trace, f, indent=1)
+
+#Collects the calls made outside of any activated Metrics
+DEFAULT_METRICS = Metrics()
+
+def current():
+    """
+    :return: <Metrics> activated in the calling thread, DEFAULT_METRICS if none
+    """
+    return getattr(_local, "metrics", None) or DEFAULT_METRICS
+
+def activate(metrics):
+    """
+    Make the calls of the calling thread recorded into metrics.
+    :param metrics: <Metrics>, None to go back to DEFAULT_METRICS
+    :return: <Metrics> previously activated, to be restored
+    """
+    previous = getattr(_local, "metrics", None)
+    _local.metrics = metrics
+    return previous
+
+def stage(name):
+    """
+    Shortcut of current().stage(name).
+    """
+    return current().stage(name)
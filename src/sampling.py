@@ -0,0 +1,90 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+from statistics import NormalDist
+
+import numpy
+
+import extractor
+from histogram import AttributeHistogram
+
+__author__ = "Sephirothxlx"
+
+#Default configurations for sampling siblings
+CONFIDENCE = 0.95  # confidence of every frequency interval
+ERROR = 0.05  # an attribute whose interval is narrower than +/- ERROR around its frequency is decided
+INITIAL_SAMPLE_SIZE = 100  # the sample is doubled until every attribute is decided
+
+def confidence_bounds(counts, n, population, confidence=CONFIDENCE):
+    """
+    Wilson score intervals of frequencies estimated from a sample drawn without replacement.
+    :param counts: <numpy.ndarray> of occurrences in the sample
+    :param n: sample size
+    :param population: number of nodes the sample is drawn from
+    :param confidence: confidence of the intervals
+    :return: (lower, upper, half width) <numpy.ndarray>
+    """
+    counts = numpy.asarray(counts, dtype=numpy.float64)
+    if n >= population:
+        # The whole population is known, frequencies are exact
+        p = counts / max(n, 1)
+        return p, p, numpy.zeros(len(p))
+    # Finite population correction, folded into an effective sample size
+    n_eff = n * (population - 1) / (population - n)
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = counts / n
+    denominator = 1 + z * z / n_eff
+    center = (p + z * z / (2 * n_eff)) / denominator
+    half = z * numpy.sqrt(p * (1 - p) / n_eff + z * z / (4 * n_eff * n_eff)) / denominator
+    return center - half, center + half, half
+
+def undecided(counts, n, population, ALPHA, confidence=CONFIDENCE, error=ERROR):
+    """
+    Check which frequencies cannot be told apart from ALPHA yet.
+    :return: <numpy.ndarray> of <bool>, True where the interval straddles ALPHA and is wider than error
+    """
+    lower, upper, half = confidence_bounds(counts, n, population, confidence)
+    return (lower <= ALPHA) & (upper > ALPHA) & (half > error)
+
+def sample_attributes(siblings, ALPHA, confidence=CONFIDENCE, error=ERROR, initial_size=INITIAL_SAMPLE_SIZE,
+                      max_workers=None, seed=None):
+    """
+    Infer the attributes held by more than ALPHA of the siblings from a random sample of them.
+    The sample grows until the frequency of every attribute seen, and the bound of those
+    never seen, is decided with the given confidence or within the given error.
+    :param siblings: collection of <Node>
+    :param confidence: confidence of every frequency interval
+    :param error: half width under which a frequency is considered decided
+    :param initial_size: size of the first sample
+    :param max_workers: maximum number of concurrent queries, workers.MAX_WORKERS if not given
+    :param seed: seed of the random generator
+    :return: (<set> of attributes, <list> of sampled <Node>, {attribute: number of sampled nodes having it})
+    """
+    population = list(siblings)
+    random.Random(seed).shuffle(population)
+    num_population = len(population)
+
+    histogram = AttributeHistogram()
+    sample = []
+    n = 0
+    size = min(initial_size, num_population)
+    while True:
+        batch = population[len(sample):size]
+        sample.extend(batch)
+        failures = []
+        histogram.update(extractor.count_nodes_attributes(batch, None, max_workers, failures))
+        n += len(batch) - len(failures)
+        if size >= num_population:
+            break
+        if n > 0:
+            # Attributes never seen in the sample share the bound of a zero count
+            counts = numpy.append(histogram.counts(), 0)
+            if not undecided(counts, n, num_population, ALPHA, confidence, error).any():
+                break
+        size = min(num_population, 2 * size)
+
+    logging.info("Sampled {} out of {} siblings ({} counted)".format(len(sample), num_population, n))
+    target_attributes = histogram.select(n * ALPHA) if n > 0 else set()
+    return target_attributes, sample, {x: histogram[x] for x in target_attributes}
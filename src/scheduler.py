@@ -0,0 +1,265 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import logging
+import random
+import threading
+import time
+
+import requests
+
+__author__ = "Sephirothxlx"
+
+#Default configurations for request schedulers
+RATE = 20.0  # requests per second per target, None for no limit
+BURST = 10  # requests sent at once after an idle period
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_RETRIES = 5  # per request
+BASE_DELAY = 0.5  # seconds before the first retry, doubled on every further one
+MAX_DELAY = 30.0  # seconds
+RETRY_RATIO = 0.2  # retries allowed per successful request, on top of MIN_RETRIES
+MIN_RETRIES = 10
+
+#HTTP statuses meaning the server is overloaded or briefly unavailable
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def is_retryable(e):
+    """
+    :param e: exception raised by a request
+    :return: True if sending the request again may succeed
+    """
+    if isinstance(e, requests.HTTPError):
+        return e.response is not None and e.response.status_code in RETRY_STATUSES
+    return isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+def retry_after(e):
+    """
+    :return: seconds asked by the server in a Retry-After header, None if not given
+    """
+    response = getattr(e, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+class TokenBucket(object):
+    """
+    Allow rate requests per second on average, and up to burst requests at once.
+    """
+
+    def __init__(self, rate, burst=BURST, clock=time.monotonic, sleep=time.sleep):
+        """
+        :param rate: tokens added per second, None for no limit
+        :param burst: maximum number of tokens kept
+        """
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """
+        Wait until a token is available and take it.
+        """
+        if self.rate is None:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.burst, self.tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            self.sleep(delay)
+
+class AdaptiveLimit(object):
+    """
+    Number of requests in flight, adapted by additive increase and multiplicative decrease:
+    it grows by one every time a full window of requests succeeds and is halved when the
+    server pushes back.
+    """
+
+    def __init__(self, initial=INITIAL_CONCURRENCY, maximum=MAX_CONCURRENCY, minimum=1):
+        self.limit = float(initial)
+        self.maximum = maximum
+        self.minimum = minimum
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self):
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    def release(self, success):
+        """
+        :param success: False if the server pushed back on the request
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if success:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                self.limit = max(self.minimum, self.limit / 2)
+            self._condition.notify_all()
+
+class RetryBudget(object):
+    """
+    Cap retries to a share of the successful requests, so that an unavailable server
+    is not flooded with retries.
+    """
+
+    def __init__(self, ratio=RETRY_RATIO, minimum=MIN_RETRIES):
+        self.ratio = ratio
+        self.balance = float(minimum)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self.balance += self.ratio
+
+    def withdraw(self):
+        """
+        :return: True if a retry is allowed
+        """
+        with self._lock:
+            if self.balance < 1:
+                return False
+            self.balance -= 1
+            return True
+
+class Scheduler(object):
+    """
+    Send the requests to one target through a token bucket and an adaptive concurrency limit,
+    retrying the failed ones with jittered exponential backoff within a retry budget.
+    """
+
+    def __init__(self, name, rate=RATE, burst=BURST, initial_concurrency=INITIAL_CONCURRENCY,
+                 max_concurrency=MAX_CONCURRENCY, max_retries=MAX_RETRIES, base_delay=BASE_DELAY,
+                 max_delay=MAX_DELAY, retry_ratio=RETRY_RATIO, min_retries=MIN_RETRIES,
+                 clock=time.monotonic, sleep=time.sleep, seed=None):
+        """
+        :param name: endpoint or engine name, for logging
+        :param rate: requests per second, None for no limit
+        :param max_retries: retries of one request before it is abandoned
+        :param clock: function returning seconds, replaceable in tests
+        :param sleep: function waiting for seconds, replaceable in tests
+        :param seed: seed of the jitter
+        """
+        self.name = name
+        self.bucket = TokenBucket(rate, burst, clock, sleep)
+        self.concurrency = AdaptiveLimit(initial_concurrency, max_concurrency)
+        self.budget = RetryBudget(retry_ratio, min_retries)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.sleep = sleep
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "succeeded": 0, "retried": 0, "abandoned": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def backoff(self, attempt, e=None):
+        """
+        :param attempt: number of the retry, from 1
+        :param e: exception of the failed attempt
+        :return: seconds to wait, the Retry-After of the server or a full jitter exponential delay
+        """
+        delay = retry_after(e) if e is not None else None
+        if delay is not None:
+            return min(delay, self.max_delay)
+        with self._lock:
+            return self._random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def call(self, send):
+        """
+        Send a request, retrying it while it fails with a retryable error.
+        :param send: function sending the request and returning its response
+        :return: response
+        """
+        self._count("requests")
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            self.concurrency.acquire()
+            try:
+                result = send()
+            except Exception as e:
+                retryable = is_retryable(e)
+                self.concurrency.release(not retryable)
+                if not retryable:
+                    self._count("failed")
+                    raise
+                attempt += 1
+                if attempt > self.max_retries or not self.budget.withdraw():
+                    self._count("abandoned")
+                    logging.warning("Abandoned request to {} after {} attempts: {}".format(self.name, attempt, e))
+                    raise
+                self._count("retried")
+                self.sleep(self.backoff(attempt, e))
+                continue
+            self.concurrency.release(True)
+            self.budget.deposit()
+            self._count("succeeded")
+            return result
+
+    def stats(self):
+        """
+        :return: <dict> of request counts, current concurrency limit and retry budget
+        """
+        with self._lock:
+            stats = dict(self.counts)
+        stats["concurrency"] = int(self.concurrency.limit)
+        stats["budget"] = self.budget.balance
+        return stats
+
+#Keyword arguments of the Scheduler of a kind of target, e.g. {"search": {"rate": None}}
+SCHEDULER_CONFIG = {
+    "sparql": {},
+    # Search engines already space their requests with search.SEARCH_MIN_INTERVAL
+    "search": {"rate": None},
+}
+
+schedulers = {}
+schedulers_lock = threading.Lock()
+
+def get_scheduler(kind, target):
+    """
+    Get the shared scheduler of a target, creating it on first use.
+    :param kind: "sparql" or "search"
+    :param target: endpoint or engine name
+    :return: <Scheduler>
+    """
+    with schedulers_lock:
+        scheduler = schedulers.get((kind, target))
+        if scheduler is None:
+            scheduler = Scheduler(target, **SCHEDULER_CONFIG.get(kind, {}))
+            schedulers[(kind, target)] = scheduler
+        return scheduler
+
+def stats():
+    """
+    :return: <dict> of {(kind, target): stats} of every scheduler
+    """
+    with schedulers_lock:
+        return {key: scheduler.stats() for key, scheduler in schedulers.items()}
+
+def reset():
+    """
+    Drop every scheduler, e.g. after changing SCHEDULER_CONFIG.
+    """
+    with schedulers_lock:
+        schedulers.clear()
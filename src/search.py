@@ -1,13 +1,28 @@
 # !/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import os
 import requests
 import re
+import threading
+import time
 from bs4 import BeautifulSoup
 
+import cache
+import metrics
+import transport
+import workers
+
 
 __author__ = "Sephirothxlx"
 
+#Search pages queried by the following functions
+GOOGLE_SEARCH_URL = "https://www.google.com/search"
+BAIDU_SEARCH_URL = "http://www.baidu.com/s"
+BING_SEARCH_URL = "https://www.bing.com/search"
+SEARCH_CONNECT_TIMEOUT = 10  # seconds
+SEARCH_READ_TIMEOUT = 30  # seconds, a stalled page raises <requests.Timeout>, which the scheduler retries
+
 #all the following functions return 1000000, which is a integer
 
 def get_search_results_Google(keyword):
@@ -15,7 +30,9 @@ def get_search_results_Google(keyword):
 	:param keyword: <str>
 	:return: search results number
 	"""
-	r = requests.get("https://www.google.com/search",params={'q':keyword})
+	r = requests.get(GOOGLE_SEARCH_URL,params={'q':keyword},timeout=(SEARCH_CONNECT_TIMEOUT,SEARCH_READ_TIMEOUT))
+	# A 429 or 503 is raised as <requests.HTTPError>, which the scheduler retries
+	r.raise_for_status()
 	soup = BeautifulSoup(r.text, "html.parser")
 	res = soup.find("div",{"id":"resultStats"})
 	n_text = res.text.split(' ')[1].split(',')
@@ -29,7 +46,8 @@ def get_search_results_Baidu(keyword):
 	:param keyword: <str>
 	:return: search results number
 	"""
-	r = requests.get("http://www.baidu.com/s",params={'wd':keyword})
+	r = requests.get(BAIDU_SEARCH_URL,params={'wd':keyword},timeout=(SEARCH_CONNECT_TIMEOUT,SEARCH_READ_TIMEOUT))
+	r.raise_for_status()
 	soup = BeautifulSoup(r.text, "html.parser")
 	res = soup.find("div",{"class":"nums"})
 	n_text=re.findall(r"\d+",res.text)
@@ -43,7 +61,8 @@ def get_search_results_Bing(keyword):
 	:param keyword: <str>
 	:return: search results number
 	"""
-	r = requests.get("https://www.bing.com/search",params={'q':keyword})
+	r = requests.get(BING_SEARCH_URL,params={'q':keyword},timeout=(SEARCH_CONNECT_TIMEOUT,SEARCH_READ_TIMEOUT))
+	r.raise_for_status()
 	soup = BeautifulSoup(r.text, "html.parser")
 	res = soup.find("span",{"class":"sb_count"})
 	n_text = res.text.split(' ')[0].split(',')
@@ -52,6 +71,117 @@ def get_search_results_Bing(keyword):
 		number+=n
 	return int(number)
 
+#Default configurations for search engines
+SEARCH_CACHE_FILENAME = os.path.join(os.path.expanduser("~"), ".dbpedia_extender", "search_cache.sqlite")
+SEARCH_CACHE_TTL = 30 * 24 * 3600  # seconds
+SEARCH_MAX_WORKERS = 6
+SEARCH_MIN_INTERVAL = 1.0  # seconds between two requests to the same engine
+
+#Persistent cache of hit counts keyed on (engine, keyword)
+SEARCH_CACHE = cache.QueryCache(SEARCH_CACHE_FILENAME, ttl=SEARCH_CACHE_TTL)
+
+class RateLimiter(object):
+	"""
+	Space the calls to a resource by at least min_interval seconds, across threads.
+	"""
+
+	def __init__(self, min_interval):
+		self.min_interval = min_interval
+		self._next = 0.0
+		self._lock = threading.Lock()
+
+	def wait(self):
+		with self._lock:
+			now = time.time()
+			delay = self._next - now
+			self._next = max(now, self._next) + self.min_interval
+		if delay > 0:
+			time.sleep(delay)
+
+class SearchEngine(object):
+	"""
+	Search engine giving the number of results of a keyword.
+	Subclass it and override count() to plug another engine, e.g. a local stub for tests.
+	"""
+
+	def __init__(self, name, min_interval=SEARCH_MIN_INTERVAL):
+		"""
+		:param name: <str> unique name of the engine, used as cache key
+		:param min_interval: seconds between two requests to this engine
+		"""
+		self.name = name
+		self.limiter = RateLimiter(min_interval)
+
+	def count(self, keyword):
+		"""
+		:param keyword: <str>
+		:return: search results number
+		"""
+		raise NotImplementedError
+
+	def _send(self, keyword):
+		# Only the requests reaching the network are spaced, replayed ones are answered at once
+		self.limiter.wait()
+		return self.count(keyword)
+
+	def get_search_results(self, keyword):
+		"""
+		Get the number of results, from the cache if available.
+		:param keyword: <str>
+		:return: search results number
+		"""
+		start = time.time()
+		cached = transport.TRANSPORT.cached
+		number = SEARCH_CACHE.get(self.name, keyword) if cached else None
+		if number is not None:
+			metrics.current().record("search", self.name, time.time() - start, 1, cached=True)
+			return number
+		start = time.time()
+		number = transport.TRANSPORT.search(self.name, keyword, self._send)
+		metrics.current().record("search", self.name, time.time() - start, 1)
+		if cached:
+			SEARCH_CACHE.put(self.name, keyword, number)
+		return number
+
+class FunctionEngine(SearchEngine):
+	"""
+	Search engine backed by one of the get_search_results_* functions.
+	"""
+
+	def __init__(self, name, func, min_interval=SEARCH_MIN_INTERVAL):
+		SearchEngine.__init__(self, name, min_interval)
+		self.func = func
+
+	def count(self, keyword):
+		return self.func(keyword)
+
+#Engines summed by get_search_results_many(), replace them to use other engines
+ENGINES = [
+	FunctionEngine("google", get_search_results_Google),
+	FunctionEngine("baidu", get_search_results_Baidu),
+	FunctionEngine("bing", get_search_results_Bing),
+]
+
+def get_search_results_many(keywords, engines=None, max_workers=None):
+	"""
+	Sum the search results numbers of every engine for many keywords,
+	querying all (engine, keyword) pairs concurrently.
+	:param keywords: <list> of <str>
+	:param engines: <list> of <SearchEngine>, ENGINES if not given
+	:param max_workers: maximum number of concurrent requests, SEARCH_MAX_WORKERS if not given
+	:return: <dict> of {keyword: search results number}
+	"""
+	engines = ENGINES if engines is None else engines
+	keywords = list(dict.fromkeys(keywords))
+	pairs = [(engine, keyword) for keyword in keywords for engine in engines]
+	totals = {keyword: 0 for keyword in keywords}
+	fetch = lambda pair: pair[0].get_search_results(pair[1])
+	for pair, number, e in workers.map_bounded(fetch, pairs, max_workers or SEARCH_MAX_WORKERS):
+		if e is not None:
+			raise e
+		totals[pair[1]] += number
+	return totals
+
 #For function tests
 if __name__ == "__main__":
 	print (get_search_results_Baidu("huawei_p9 android"))
@@ -0,0 +1,260 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import logging
+import re
+import time
+
+import dataset
+import dbnode
+import extractor
+import hierarchy
+import scheduler
+import search
+import transport
+import triplestore
+
+__author__ = "Sephirothxlx"
+
+#Default configurations for the extraction service
+HOST = "127.0.0.1"
+PORT = 8080
+SERVICE_WORKERS = 4  # extractions run at once, each with its own concurrent queries
+MAX_BODY_SIZE = 1 << 20  # bytes
+DEFAULT_ALPHA = 0.5
+
+#Absolute IRI, without the characters RFC 3987 forbids, which would break out of <%s> in the SPARQL templates
+IRI_PATTERN = re.compile(r'^[A-Za-z][A-Za-z0-9+.\-]*:[^\x00-\x20<>"{}|^`\\]+$')
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 500: "Internal Server Error"}
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        Exception.__init__(self, message)
+        self.status = status
+
+def check_iri(uri):
+    """
+    :param uri: target sent by a client
+    :return: uri, if it is an absolute IRI
+    :raise HTTPError: 400 otherwise
+    """
+    if not isinstance(uri, str) or IRI_PATTERN.match(uri) is None:
+        raise HTTPError(400, "Invalid uri: {}".format(uri))
+    return uri
+
+class ResultCollector(object):
+    """
+    Stand-in for a <ResultWriter> keeping the result of one extraction in memory.
+    """
+
+    def __init__(self):
+        self.record = None
+
+    def write(self, target_uuid, attributes, support=None, num_siblings=None, scores=None):
+        attributes = [{"property": p, "value": v} for p, v in sorted(attributes)]
+        for attribute in attributes:
+            key = (attribute["property"], attribute["value"])
+            if support is not None:
+                attribute["support"] = support.get(key, 0)
+            if scores is not None and key in scores:
+                attribute["score"] = scores[key]
+        self.record = {"target": target_uuid, "siblings": num_siblings, "attributes": attributes}
+
+class ExtractionService(object):
+    """
+    Long-running extractor answering requests over HTTP.
+    The node registry, query caches and endpoint connections of the process stay warm between
+    requests, and concurrent requests for the same target and alpha share one extraction.
+    """
+
+    def __init__(self, max_workers=SERVICE_WORKERS, query_workers=None):
+        """
+        :param max_workers: number of extractions run at once
+        :param query_workers: maximum number of concurrent queries per extraction, workers.MAX_WORKERS if not given
+        """
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.query_workers = query_workers
+        self.pending = {}  # (uuid, alpha) -> <asyncio.Future> of the running extraction
+        self.started = time.time()
+        self.counts = {"requests": 0, "extractions": 0, "coalesced": 0, "errors": 0}
+        self.extract_seconds = 0.0
+        self.stages = {}  # stage name -> {"wall", "calls"} summed over extractions
+
+    def _extract(self, uuid, alpha):
+        collector = ResultCollector()
+        start = time.time()
+        extract_metrics = extractor.extract(uuid, None, alpha, self.query_workers, result_writer=collector)
+        record = collector.record
+        record["seconds"] = time.time() - start
+        return record, extract_metrics.summary()
+
+    async def extract(self, uuid, alpha):
+        """
+        Extract the properties of a target, joining the extraction already running for it if any.
+        :return: <dict> of the result
+        """
+        key = (uuid, alpha)
+        future = self.pending.get(key)
+        if future is not None:
+            self.counts["coalesced"] += 1
+            return await asyncio.shield(future)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, self._extract, uuid, alpha)
+        self.pending[key] = future
+        try:
+            # Shielded so that a client going away does not cancel the extraction shared with others
+            record, summary = await asyncio.shield(future)
+        finally:
+            del self.pending[key]
+        self.counts["extractions"] += 1
+        self.extract_seconds += record["seconds"]
+        for name, stats in summary["stages"].items():
+            total = self.stages.setdefault(name, {"wall": 0.0, "calls": 0})
+            total["wall"] += stats["wall"]
+            total["calls"] += stats["calls"]
+        return record
+
+    async def extract_batch(self, uuids, alpha):
+        """
+        :return: <list> of results, an "error" entry for every target that failed
+        """
+        uuids = list(dict.fromkeys(uuids))
+        results = await asyncio.gather(*[self.extract(uuid, alpha) for uuid in uuids], return_exceptions=True)
+        return [r if not isinstance(r, Exception) else {"target": uuid, "error": str(r)}
+                for uuid, r in zip(uuids, results)]
+
+    def health(self):
+        """
+        :return: <dict> of the state of the service and of its caches
+        """
+        extractions = self.counts["extractions"]
+        return {
+            "status": "ok",
+            "uptime": time.time() - self.started,
+            "counts": dict(self.counts),
+            "running": len(self.pending),
+            "mean_extract_seconds": self.extract_seconds / extractions if extractions else None,
+            "stages": self.stages,
+            "registry": dbnode.registry.stats(),
+            "query_cache": dataset.QUERY_CACHE.stats(),
+            "search_cache": search.SEARCH_CACHE.stats(),
+            "schedulers": {"{} {}".format(kind, target): stats for (kind, target), stats in scheduler.stats().items()},
+        }
+
+    async def route(self, method, path, body):
+        if path == "/health":
+            if method != "GET":
+                raise HTTPError(405, "Use GET")
+            return self.health()
+        if path not in ("/extract", "/batch"):
+            raise HTTPError(404, "Unknown path: {}".format(path))
+        if method != "POST":
+            raise HTTPError(405, "Use POST")
+        try:
+            request = json.loads(body.decode("utf-8") or "{}")
+        except ValueError as e:
+            raise HTTPError(400, "Invalid JSON: {}".format(e))
+        try:
+            alpha = float(request.get("alpha", DEFAULT_ALPHA))
+        except (TypeError, ValueError):
+            raise HTTPError(400, "Invalid alpha: {}".format(request.get("alpha")))
+        if path == "/extract":
+            if "uri" not in request:
+                raise HTTPError(400, "Missing uri")
+            return await self.extract(check_iri(request["uri"]), alpha)
+        if not isinstance(request.get("uris"), list):
+            raise HTTPError(400, "Missing uris")
+        # Every target is checked before any extraction starts
+        return await self.extract_batch([check_iri(uri) for uri in request["uris"]], alpha)
+
+    async def handle(self, reader, writer):
+        """
+        Serve the requests of one connection, kept alive until the client closes it.
+        """
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                self.counts["requests"] += 1
+                try:
+                    length = int(headers.get("content-length", 0))
+                    if length > MAX_BODY_SIZE:
+                        raise HTTPError(413, "Body larger than {} bytes".format(MAX_BODY_SIZE))
+                    body = await reader.readexactly(length) if length else b""
+                    status, response = 200, await self.route(method, path.split("?", 1)[0], body)
+                except HTTPError as e:
+                    status, response = e.status, {"error": str(e)}
+                except Exception as e:
+                    logging.exception("Request {} {} failed".format(method, path))
+                    self.counts["errors"] += 1
+                    status, response = 500, {"error": str(e)}
+                data = json.dumps(response).encode("utf-8")
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                             "Connection: {}\r\n\r\n".format(status, REASONS[status], len(data),
+                                                             "keep-alive" if keep_alive else "close").encode("latin-1"))
+                writer.write(data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host=HOST, port=PORT, unix_path=None):
+        """
+        Serve until cancelled, on a Unix socket if unix_path is given, else on host:port.
+        """
+        if unix_path is not None:
+            server = await asyncio.start_unix_server(self.handle, path=unix_path)
+            logging.info("Serving on {}".format(unix_path))
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            logging.info("Serving on http://{}:{}".format(host, port))
+        async with server:
+            await server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve extractions over HTTP with warm caches.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--unix", help="path of a Unix socket to serve on instead of host:port")
+    parser.add_argument("--workers", type=int, default=SERVICE_WORKERS, help="extractions run at once")
+    parser.add_argument("--query-workers", type=int, default=None, help="concurrent queries per extraction")
+    parser.add_argument("--backend", nargs="*", help="N-Triples dumps served instead of the endpoint")
+    parser.add_argument("--hierarchy", help="directory of a hierarchy index built by hierarchy.py")
+    parser.add_argument("--replay", help="archive path prefix to answer every request from, see transport.py")
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(asctime)s: %(levelname)s: %(message)s")
+    logging.root.setLevel(level=logging.INFO)
+    if args.backend:
+        dataset.use_backend(triplestore.load(*args.backend))
+    if args.hierarchy:
+        dataset.use_hierarchy(hierarchy.Hierarchy.load(args.hierarchy))
+    if args.replay:
+        transport.use_transport(transport.REPLAY, args.replay)
+    service = ExtractionService(args.workers, args.query_workers)
+    try:
+        asyncio.run(service.serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,160 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import re
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+__author__ = "Sephirothxlx"
+
+#Default configurations for SPARQL clients
+CONNECT_TIMEOUT = 10  # seconds
+READ_TIMEOUT = 120  # seconds
+POOL_SIZE = 16  # connections kept alive per endpoint, shared by every thread
+STREAM_CHUNK_SIZE = 65536  # bytes read at once from a streamed response
+
+TSV = "text/tab-separated-values"
+TSV_ESCAPE = re.compile(r"\\(.)")
+TSV_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", '"': '"', "\\": "\\"}
+
+clients = {}
+clients_lock = threading.Lock()
+
+def parse_tsv_term(term):
+    """
+    Get the value of an RDF term written in SPARQL TSV results.
+    :param term: <str> IRI, literal, blank node or bare number
+    :return: <str> IRI or lexical form of the literal, the same as "value" in JSON results,
+        None for an unbound variable
+    """
+    if term == "":
+        return None
+    if term[0] == "<" and term[-1] == ">":
+        return term[1:-1]
+    if term[0] == '"':
+        # Language tags and datatypes follow the closing quote
+        value = term[1:term.rindex('"')]
+        if "\\" in value:
+            value = TSV_ESCAPE.sub(lambda m: TSV_ESCAPES.get(m.group(1), m.group(1)), value)
+        return value
+    return term
+
+def parse_tsv_header(line):
+    """
+    :param line: <str> first line of SPARQL TSV results
+    :return: <list> of variable names, without "?" nor the quotes Virtuoso writes around them
+    """
+    return [v.strip().strip('"').lstrip("?$") for v in line.split("\t")]
+
+def iter_tsv_rows(lines, stats=None):
+    """
+    Parse the rows of SPARQL TSV results one line at a time, as they are received.
+    :param lines: iterable of <bytes> lines following the header
+    :param stats: <dict> whose "bytes" count is increased by every line if given
+    :return: generator of tuples of values
+    """
+    for line in lines:
+        if stats is not None:
+            stats["bytes"] = stats.get("bytes", 0) + len(line) + 1
+        yield tuple(parse_tsv_term(term) for term in line.decode("utf-8").split("\t"))
+
+class SparqlClient(object):
+    """
+    Long-lived client of a SPARQL endpoint.
+    One keep-alive session is shared by every thread: its connection pool is thread-safe, so
+    the short-lived worker threads of workers.map_bounded() reuse the same connections.
+    """
+
+    def __init__(self, endpoint, connect_timeout=None, read_timeout=None, pool_size=None):
+        """
+        :param endpoint: dataset's address
+        :param connect_timeout: seconds to wait for a connection, CONNECT_TIMEOUT if not given
+        :param read_timeout: seconds to wait for a response, READ_TIMEOUT if not given
+        :param pool_size: connections kept alive, POOL_SIZE if not given
+        """
+        self.endpoint = endpoint
+        self.connect_timeout = connect_timeout or CONNECT_TIMEOUT
+        self.read_timeout = read_timeout or READ_TIMEOUT
+        self.pool_size = pool_size or POOL_SIZE
+        self._session = None
+        self._lock = threading.Lock()
+
+    def session(self):
+        """
+        :return: <requests.Session> of the endpoint, created on first use
+        """
+        with self._lock:
+            if self._session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({
+                    "Accept": "application/sparql-results+json",
+                    "Accept-Encoding": "gzip, deflate",
+                })
+                self._session = session
+            return self._session
+
+    def query(self, sql, stats=None):
+        """
+        Send a query and decode its JSON results.
+        :param sql: SPARQL query
+        :param stats: <dict> filled with the number of "bytes" received if given
+        :return: <dict> of SPARQL JSON results
+        """
+        r = self.session().post(
+            self.endpoint,
+            data={"query": sql},
+            timeout=(self.connect_timeout, self.read_timeout)
+        )
+        r.raise_for_status()
+        if stats is not None:
+            stats["bytes"] = len(r.content)
+        return r.json()
+
+    def select(self, sql, stats=None):
+        """
+        Send a SELECT query asking for TSV results, parsed line by line while they are received,
+        without building the JSON document.
+        :param sql: SPARQL SELECT query
+        :param stats: <dict> filled with the number of "bytes" received if given
+        :return: (<list> of variable names, <list> of rows, each a tuple of values)
+        """
+        r = self.session().post(
+            self.endpoint,
+            data={"query": sql},
+            headers={"Accept": TSV},
+            timeout=(self.connect_timeout, self.read_timeout),
+            stream=True
+        )
+        with r:
+            r.raise_for_status()
+            received = {}
+            lines = r.iter_lines(chunk_size=STREAM_CHUNK_SIZE)
+            header = next(lines, None)
+            if header is None:
+                variables = []
+                rows = []
+            else:
+                received["bytes"] = len(header) + 1
+                variables = parse_tsv_header(header.decode("utf-8"))
+                rows = list(iter_tsv_rows(lines, received))
+        if stats is not None:
+            stats["bytes"] = received.get("bytes", 0)
+        return variables, rows
+
+def get_client(endpoint):
+    """
+    Get the shared client of an endpoint, creating it on first use.
+    :param endpoint: dataset's address
+    :return: <SparqlClient>
+    """
+    with clients_lock:
+        client = clients.get(endpoint)
+        if client is None:
+            client = SparqlClient(endpoint)
+            clients[endpoint] = client
+        return client
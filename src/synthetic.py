@@ -0,0 +1,115 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import argparse
+import random
+import time
+
+import search
+import triplestore
+from triplestore import TripleStore
+
+__author__ = "Sephirothxlx"
+
+RESOURCE = "http://synthetic.example.org/resource/"
+ONTOLOGY = "http://synthetic.example.org/ontology/"
+CLASS = "http://synthetic.example.org/class/"
+
+def generate(num_types=2, category_fanout=3, siblings_per_class=100, attributes_per_entity=10,
+             conflict_rate=0.3, seed=0):
+    """
+    Generate a synthetic knowledge graph shaped like the part of DB-pedia the extractor reads.
+    Every type has its own entities, categories and attribute profile: most entities share
+    the dominant value of each profile property, the others get a random one. One property
+    per type has two competing values, so that validation has conflicts to resolve.
+    :param num_types: number of leaf classes, all sub classes of one root class
+    :param category_fanout: number of categories per type, each entity is in 1 to category_fanout of them
+    :param siblings_per_class: number of entities of every type
+    :param attributes_per_entity: number of PV-pairs of every entity, besides type, categories and label
+    :param conflict_rate: share of entities holding both competing values
+    :param seed: seed of the random generator
+    :return: <TripleStore>
+    """
+    rnd = random.Random(seed)
+    store = TripleStore()
+    root = CLASS + "Thing"
+    for t in range(num_types):
+        type_id = CLASS + "Type{}".format(t)
+        store.add(type_id, triplestore.RDFS_SUBCLASSOF, root)
+        categories = [RESOURCE + "Category:Type{}_{}".format(t, c) for c in range(category_fanout)]
+        profile = [(ONTOLOGY + "p{}".format(k), RESOURCE + "V{}_{}".format(t, k), rnd.uniform(0.3, 0.95))
+                   for k in range(max(attributes_per_entity - 1, 0))]
+        conflict = ONTOLOGY + "conflict"
+        for e in range(siblings_per_class):
+            entity_id = entity_uuid(t, e)
+            store.add(entity_id, triplestore.RDF_TYPE, type_id)
+            for category_id in rnd.sample(categories, rnd.randint(1, category_fanout)):
+                store.add(entity_id, triplestore.DCT_SUBJECT, category_id)
+            store.add(entity_id, triplestore.RDFS_LABEL, "Entity {} of type {}".format(e, t), "en")
+            for property_id, value, prevalence in profile:
+                if rnd.random() >= prevalence:
+                    value = RESOURCE + "R{}".format(rnd.randrange(siblings_per_class))
+                store.add(entity_id, property_id, value)
+            if attributes_per_entity > 0:
+                r = rnd.random()
+                if r < conflict_rate:
+                    store.add(entity_id, conflict, RESOURCE + "A{}".format(t))
+                    store.add(entity_id, conflict, RESOURCE + "B{}".format(t))
+                else:
+                    store.add(entity_id, conflict, RESOURCE + ("A{}" if r < 0.5 + conflict_rate / 2 else "B{}").format(t))
+    return store
+
+def entity_uuid(type_index, entity_index):
+    """
+    :return: <str> uuid of the entity_index-th entity of the type_index-th type
+    """
+    return RESOURCE + "Entity{}_{}".format(type_index, entity_index)
+
+def write_ntriples(store, filename):
+    """
+    Dump a store as N-Triples, e.g. to load it in another process or endpoint.
+    :param store: <TripleStore>
+    :param filename: path of the dump
+    """
+    labels = {store.terms.decode(s): value for s, value in store.labels.items()}
+    with open(filename, "w", encoding="utf-8") as f:
+        for s, predicates in store.spo.items():
+            subject = store.terms.decode(s)
+            for p, objects in predicates.items():
+                predicate = store.terms.decode(p)
+                for o in objects:
+                    value = store.terms.decode(o)
+                    if predicate == triplestore.RDFS_LABEL and labels.get(subject) == value:
+                        obj = '"{}"@en'.format(value.replace("\\", "\\\\").replace('"', '\\"'))
+                    else:
+                        obj = "<{}>".format(value)
+                    f.write("<{}> <{}> {} .\n".format(subject, predicate, obj))
+
+class StubSearchEngine(search.SearchEngine):
+    """
+    Deterministic stand-in for a web search engine, answering without any network access.
+    """
+
+    def __init__(self, name, latency=0.0):
+        """
+        :param latency: seconds every request is delayed by, to mimic a remote engine
+        """
+        search.SearchEngine.__init__(self, name, min_interval=0)
+        self.latency = latency
+
+    def count(self, keyword):
+        if self.latency:
+            time.sleep(self.latency)
+        return 1 + sum(ord(c) for c in self.name + keyword) % 100000
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Write a synthetic knowledge graph as N-Triples.")
+    parser.add_argument("output", help="path of the dump")
+    parser.add_argument("--types", type=int, default=2)
+    parser.add_argument("--fanout", type=int, default=3)
+    parser.add_argument("--siblings", type=int, default=100)
+    parser.add_argument("--attributes", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_ntriples(generate(args.types, args.fanout, args.siblings, args.attributes, seed=args.seed), args.output)
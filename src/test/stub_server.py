@@ -0,0 +1,75 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class Response(object):
+	"""
+	Scripted response of a <StubServer>.
+	"""
+
+	def __init__(self, status=200, body="", headers=None, delay=0.0):
+		"""
+		:param status: HTTP status
+		:param body: <str> body
+		:param headers: <dict> of extra headers
+		:param delay: seconds waited before answering, to stall a client
+		"""
+		self.status = status
+		self.body = body.encode("utf-8")
+		self.headers = headers or {}
+		self.delay = delay
+
+class StubServer(object):
+	"""
+	Local HTTP server answering GET and POST requests with scripted responses in order,
+	then with a default response once they are used up.
+	"""
+
+	def __init__(self, responses=(), default=None, path="/"):
+		"""
+		:param responses: iterable of <Response> of the first requests
+		:param default: <Response> of the following requests, an empty 200 if not given
+		:param path: path of self.url
+		"""
+		self.responses = list(responses)
+		self.default = default or Response()
+		self.requests = 0
+		self.bodies = []  # bodies of the POST requests received
+		stub = self
+
+		class Handler(BaseHTTPRequestHandler):
+			def answer(self):
+				stub.requests += 1
+				response = stub.responses.pop(0) if stub.responses else stub.default
+				if response.delay:
+					time.sleep(response.delay)
+				self.send_response(response.status)
+				for name, value in response.headers.items():
+					self.send_header(name, value)
+				self.send_header("Content-Length", str(len(response.body)))
+				self.end_headers()
+				self.wfile.write(response.body)
+
+			def do_GET(self):
+				self.answer()
+
+			def do_POST(self):
+				stub.bodies.append(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+				self.answer()
+
+			def log_message(self, *args):
+				pass
+
+		self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+		self.url = "http://127.0.0.1:{}{}".format(self.server.server_address[1], path)
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+	def close(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.close()
@@ -0,0 +1,76 @@
+import cache
+
+ENDPOINT = "http://x/sparql"
+
+class Clock(object):
+	"""
+	Replaces the time module of cache.py, time only moves when told to.
+	"""
+
+	def __init__(self, now=1000.0):
+		self.now = now
+
+	def time(self):
+		return self.now
+
+def with_clock(test):
+	def run():
+		clock = Clock()
+		previous = cache.time
+		cache.time = clock
+		try:
+			test(clock)
+		finally:
+			cache.time = previous
+	run.__name__ = test.__name__
+	return run
+
+def query(i):
+	return "SELECT ?s WHERE { ?s ?p %d }" % i
+
+@with_clock
+def test_least_recently_used_evicted(clock):
+	c = cache.QueryCache(":memory:", ttl=None, max_entries=10)
+	for i in range(10):
+		clock.now += 1
+		c.put(ENDPOINT, query(i), [i])
+	clock.now += 1
+	assert c.get(ENDPOINT, query(0)) == [0]
+	clock.now += 1
+	# Past the cap a batch of max_entries // 10 entries is evicted besides the excess one
+	c.put(ENDPOINT, query(10), [10])
+	assert len(c) == 9
+	assert c.get(ENDPOINT, query(0)) == [0]
+	assert c.get(ENDPOINT, query(1)) is None
+	assert c.get(ENDPOINT, query(2)) is None
+	assert c.get(ENDPOINT, query(10)) == [10]
+
+@with_clock
+def test_expired_entries_missed(clock):
+	c = cache.QueryCache(":memory:", ttl=60, max_entries=None)
+	c.put(ENDPOINT, query(0), ["fresh"])
+	clock.now += 59
+	assert c.get(ENDPOINT, query(0)) == ["fresh"]
+	clock.now += 2
+	assert c.get(ENDPOINT, query(0)) is None
+	assert c.get_many(ENDPOINT, [query(0)]) == {}
+	c.put(ENDPOINT, query(0), ["refetched"])
+	assert c.get(ENDPOINT, query(0)) == ["refetched"]
+	assert len(c) == 1
+	assert (c.hits, c.misses) == (2, 2)
+
+@with_clock
+def test_put_many(clock):
+	c = cache.QueryCache(":memory:", ttl=None, max_entries=None)
+	c.put_many(ENDPOINT, {query(0): [0], query(1): [1]})
+	c.put_many(ENDPOINT, {query(1): ["new"], query(2): [2]})
+	assert len(c) == 3
+	assert c.get_many(ENDPOINT, [query(0), query(1), query(3)]) == {query(0): [0], query(1): ["new"]}
+	c.disable()
+	assert c.get(ENDPOINT, query(0)) is None
+
+if __name__ == '__main__':
+	test_least_recently_used_evicted()
+	test_expired_entries_missed()
+	test_put_many()
+	print("ok")
@@ -0,0 +1,49 @@
+import tempfile
+
+import hierarchy
+
+#A diamond under Thing, and a cycle of categories below Place
+EDGES = [
+	("Animal", "Thing"),
+	("Place", "Thing"),
+	("Mammal", "Animal"),
+	("Pet", "Animal"),
+	("Dog", "Mammal"),
+	("Dog", "Pet"),
+	("Cat:A", "Place"),
+	("Cat:B", "Cat:A"),
+	("Cat:A", "Cat:B"),
+	("Cat:C", "Cat:B"),
+]
+
+def saved_and_loaded():
+	with tempfile.TemporaryDirectory() as directory:
+		hierarchy.Hierarchy.build(EDGES).save(directory)
+		h = hierarchy.Hierarchy.load(directory)
+		# The memory-mapped arrays are read before the directory is removed
+		return {term: h.ancestors(term) for term in h.terms}, h.most_specific(["Thing", "Dog", "Pet", "Cat:C"])
+
+def test_ancestors():
+	ancestors, _ = saved_and_loaded()
+	assert sorted(ancestors["Dog"]) == ["Animal", "Mammal", "Pet", "Thing"]
+	assert ancestors["Thing"] == []
+	# Members of a cycle are ancestors of themselves
+	assert sorted(ancestors["Cat:A"]) == ["Cat:A", "Cat:B", "Place", "Thing"]
+	assert sorted(ancestors["Cat:C"]) == ["Cat:A", "Cat:B", "Place", "Thing"]
+
+def test_is_ancestor():
+	h = hierarchy.Hierarchy.build(EDGES)
+	for term in h.terms:
+		for other in h.terms:
+			assert h.is_ancestor(other, term) == (other in h.ancestors(term)), (other, term)
+	assert not h.is_ancestor("Thing", "Unknown")
+
+def test_most_specific():
+	_, specific = saved_and_loaded()
+	assert specific == ["Dog", "Cat:C"]
+
+if __name__ == '__main__':
+	test_ancestors()
+	test_is_ancestor()
+	test_most_specific()
+	print("ok")
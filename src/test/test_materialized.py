@@ -0,0 +1,70 @@
+import os
+import tempfile
+
+import dataset
+import materialized
+import triplestore
+
+TYPE = "http://x/Type0"
+CATEGORY = "http://x/Category:Fruit"
+COLOR = "http://x/color"
+
+def graph(typed, colors):
+	"""
+	Entities e0 to e4 all in CATEGORY, the typed ones also of TYPE.
+	:param typed: <set> of index of the entities of TYPE
+	:param colors: <dict> of {index: color}
+	:return: <TripleStore>
+	"""
+	store = triplestore.TripleStore()
+	for i in range(5):
+		entity_id = "http://x/e{}".format(i)
+		store.add(entity_id, triplestore.DCT_SUBJECT, CATEGORY)
+		if i in typed:
+			store.add(entity_id, triplestore.RDF_TYPE, TYPE)
+		store.add(entity_id, COLOR, "http://x/" + colors.get(i, "red"))
+	return store
+
+def snapshot(store):
+	"""
+	:return: <dict> of {class uuid: (number of members, <Counter> of attributes)}
+	"""
+	return {class_id: (store.get(class_id)[0], store.get(class_id)[1].to_counter()) for class_id in store.classes()}
+
+def build(directory, name):
+	store = materialized.HistogramStore(os.path.join(directory, name))
+	store.refresh_class(TYPE, materialized.TYPE)
+	store.refresh_class(CATEGORY, materialized.CATEGORY)
+	return store
+
+def test_refresh_equals_rebuild():
+	with tempfile.TemporaryDirectory() as directory:
+		dataset.use_backend(graph({0, 1, 2}, {}))
+		try:
+			incremental = build(directory, "incremental.sqlite")
+			assert incremental.get(CATEGORY)[1][(triplestore.RDF_TYPE, TYPE)] == 3
+
+			# e2 leaves TYPE but stays in CATEGORY, e3 joins TYPE, e1 changes color
+			dataset.use_backend(graph({0, 1, 3}, {1: "green"}))
+			assert incremental.refresh_class(TYPE, materialized.TYPE) == (1, 1)
+			assert incremental.refresh_class(CATEGORY, materialized.CATEGORY) == (0, 0)
+			incremental.refresh_entities(["http://x/e1"])
+
+			rebuilt = build(directory, "rebuilt.sqlite")
+			assert snapshot(incremental) == snapshot(rebuilt)
+			assert incremental.get(CATEGORY)[1][(triplestore.RDF_TYPE, TYPE)] == 3
+			assert incremental.get(TYPE)[1][(COLOR, "http://x/green")] == 1
+
+			# Every entity leaves TYPE
+			dataset.use_backend(graph(set(), {1: "green"}))
+			assert incremental.refresh_class(TYPE, materialized.TYPE) == (0, 3)
+			assert incremental.get(TYPE)[0] == 0
+			assert (triplestore.RDF_TYPE, TYPE) not in incremental.get(CATEGORY)[1].to_counter()
+			incremental.close()
+			rebuilt.close()
+		finally:
+			dataset.use_backend(None)
+
+if __name__ == '__main__':
+	test_refresh_equals_rebuild()
+	print("ok")
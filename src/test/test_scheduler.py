@@ -0,0 +1,116 @@
+import requests
+
+import scheduler
+import search
+from stub_server import Response, StubServer
+
+RESULT_PAGE = '<html><body><span class="sb_count">1,234 results</span></body></html>'
+
+def stub_search_server(statuses, retry_after=None):
+	"""
+	Local search page answering with scripted statuses, then with a result page.
+	:param statuses: <list> of HTTP statuses of the first responses
+	:param retry_after: Retry-After header sent with the 429 responses
+	:return: <StubServer>
+	"""
+	responses = [
+		Response(status, "unavailable", {"Retry-After": str(retry_after)} if status == 429 and retry_after is not None else None)
+		for status in statuses
+	]
+	return StubServer(responses, Response(200, RESULT_PAGE), "/search")
+
+class FakeClock(object):
+	"""
+	Clock advanced by sleep() instead of waiting, recording every delay.
+	"""
+
+	def __init__(self):
+		self.now = 0.0
+		self.delays = []
+
+	def clock(self):
+		return self.now
+
+	def sleep(self, delay):
+		self.delays.append(delay)
+		self.now += delay
+
+def search_through(statuses, retry_after=None, stub=None, **kwargs):
+	"""
+	Search Bing on a stub through a new scheduler.
+	:param stub: <StubServer> searched instead of one answering with the statuses
+	:return: (result or exception, <Scheduler>, <FakeClock>, number of requests received)
+	"""
+	stub = stub or stub_search_server(statuses, retry_after)
+	fake = FakeClock()
+	s = scheduler.Scheduler("bing", rate=None, clock=fake.clock, sleep=fake.sleep, seed=0, **kwargs)
+	url = search.BING_SEARCH_URL
+	search.BING_SEARCH_URL = stub.url
+	try:
+		result = s.call(lambda: search.get_search_results_Bing("keyword"))
+	except Exception as e:
+		result = e
+	finally:
+		search.BING_SEARCH_URL = url
+		stub.close()
+	return result, s, fake, stub.requests
+
+def test_retried_until_success():
+	result, s, fake, requests_received = search_through([503, 429, 503], retry_after=2, base_delay=0.5, max_delay=30)
+	assert result == 1234
+	assert requests_received == 4
+	assert s.counts["retried"] == 3
+	assert s.counts["abandoned"] == 0
+	assert s.counts["succeeded"] == 1
+	assert len(fake.delays) == 3
+	# Full jitter below the exponential bound, except where the server asked for a delay
+	assert 0 <= fake.delays[0] <= 0.5
+	assert fake.delays[1] == 2
+	assert 0 <= fake.delays[2] <= 2.0
+
+def test_abandoned_after_max_retries():
+	result, s, fake, requests_received = search_through([503] * 10, max_retries=3, base_delay=1, max_delay=3)
+	assert isinstance(result, requests.HTTPError)
+	assert result.response.status_code == 503
+	assert requests_received == 4
+	assert s.counts["retried"] == 3
+	assert s.counts["abandoned"] == 1
+	assert len(fake.delays) == 3
+	assert all(0 <= delay <= bound for delay, bound in zip(fake.delays, [1, 2, 3]))
+
+def test_abandoned_when_budget_is_spent():
+	result, s, fake, requests_received = search_through([503] * 10, max_retries=5, min_retries=2)
+	assert isinstance(result, requests.HTTPError)
+	assert requests_received == 3
+	assert s.counts["retried"] == 2
+	assert s.counts["abandoned"] == 1
+
+def test_client_error_not_retried():
+	result, s, fake, requests_received = search_through([404])
+	assert isinstance(result, requests.HTTPError)
+	assert requests_received == 1
+	assert s.counts["retried"] == 0
+	assert s.counts["failed"] == 1
+	assert fake.delays == []
+
+def test_stalled_page_retried():
+	# The first page stalls past the read timeout, the second one answers at once
+	stub = StubServer([Response(200, RESULT_PAGE, delay=1.0)], Response(200, RESULT_PAGE), "/search")
+	timeout = search.SEARCH_READ_TIMEOUT
+	search.SEARCH_READ_TIMEOUT = 0.2
+	try:
+		result, s, fake, requests_received = search_through([], stub=stub, base_delay=0.5)
+	finally:
+		search.SEARCH_READ_TIMEOUT = timeout
+	assert result == 1234
+	assert requests_received == 2
+	assert s.counts["retried"] == 1
+	assert len(fake.delays) == 1
+
+if __name__ == '__main__':
+	test_retried_until_success()
+	test_abandoned_after_max_retries()
+	test_abandoned_when_budget_is_spent()
+	test_client_error_not_retried()
+	test_stalled_page_retried()
+	print("ok")
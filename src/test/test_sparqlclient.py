@@ -0,0 +1,95 @@
+import dataset
+import sparqlclient
+from stub_server import Response, StubServer
+
+XSD_DATE = "http://www.w3.org/2001/XMLSchema#date"
+
+def stub_endpoint(body):
+	"""
+	Local SPARQL endpoint answering every query with the same TSV body.
+	:param body: <str> TSV results, header line included
+	:return: <StubServer>
+	"""
+	return StubServer(default=Response(200, body, {"Content-Type": sparqlclient.TSV}), path="/sparql")
+
+def test_quoted_header():
+	# Virtuoso quotes the variable names, the TSV specification prefixes them with "?"
+	assert sparqlclient.parse_tsv_header('"s"\t"p"\t"o"') == ["s", "p", "o"]
+	assert sparqlclient.parse_tsv_header("?s\t?p\t$o") == ["s", "p", "o"]
+
+def test_terms():
+	assert sparqlclient.parse_tsv_term("<http://dbpedia.org/resource/Apple>") == "http://dbpedia.org/resource/Apple"
+	assert sparqlclient.parse_tsv_term('"plain"') == "plain"
+	assert sparqlclient.parse_tsv_term('"Pomme"@fr') == "Pomme"
+	assert sparqlclient.parse_tsv_term('"2001-01-01"^^<%s>' % XSD_DATE) == "2001-01-01"
+	assert sparqlclient.parse_tsv_term(r'"say \"hi\"\tthen\\leave\n"') == 'say "hi"\tthen\\leave\n'
+	assert sparqlclient.parse_tsv_term("42") == "42"
+	assert sparqlclient.parse_tsv_term("") is None
+
+def test_select_streams_rows():
+	body = '"s"\t"name"\n<http://x/a>\t"A \\"quoted\\" name"@en\n<http://x/b>\t\n'
+	stub = stub_endpoint(body)
+	try:
+		stats = {}
+		variables, rows = sparqlclient.SparqlClient(stub.url).select("SELECT ?s ?name {}", stats)
+	finally:
+		stub.close()
+	assert variables == ["s", "name"]
+	assert rows == [("http://x/a", 'A "quoted" name'), ("http://x/b", None)]
+	assert stats["bytes"] == len(body.encode("utf-8"))
+
+def test_select_empty_response():
+	stub = stub_endpoint("")
+	try:
+		assert sparqlclient.SparqlClient(stub.url).select("SELECT ?s {}") == ([], [])
+	finally:
+		stub.close()
+
+def test_empty_response_without_header():
+	stub = stub_endpoint("")
+	endpoint = dataset.DBPEDIA_ENDPOINT
+	dataset.DBPEDIA_ENDPOINT = stub.url
+	dataset.QUERY_CACHE.disable()
+	try:
+		assert list(dataset.iter_type_members("http://x/Empty")) == []
+	finally:
+		dataset.QUERY_CACHE.enable()
+		dataset.DBPEDIA_ENDPOINT = endpoint
+		stub.close()
+
+def test_reordered_columns():
+	# The endpoint answers with other columns first, values are mapped by name
+	body = "".join([
+		'"tag"\t"o"\t"literal"\t"p"\n',
+		'""\t<http://x/Paris>\t0\t<http://x/capital>\n',
+		'"@fr"\t"Pomme"\t1\t<http://x/name>\n',
+		'"%s"\t"2001-01-01"\t1\t<http://x/date>\n' % XSD_DATE,
+	])
+	stub = stub_endpoint(body)
+	endpoint = dataset.DBPEDIA_ENDPOINT
+	dataset.DBPEDIA_ENDPOINT = stub.url
+	dataset.QUERY_CACHE.disable()
+	try:
+		pairs = dataset.get_pv_pairs("http://x/France")
+	finally:
+		dataset.QUERY_CACHE.enable()
+		dataset.DBPEDIA_ENDPOINT = endpoint
+		stub.close()
+	assert pairs == [
+		("http://x/capital", "http://x/Paris"),
+		("http://x/name", "Pomme"),
+		("http://x/date", "2001-01-01"),
+	]
+	capital, name, date = [v for _, v in pairs]
+	assert not isinstance(capital, dataset.triplestore.Literal)
+	assert name.language == "fr"
+	assert date.datatype == XSD_DATE
+
+if __name__ == '__main__':
+	test_quoted_header()
+	test_terms()
+	test_select_streams_rows()
+	test_select_empty_response()
+	test_empty_response_without_header()
+	test_reordered_columns()
+	print("ok")
@@ -0,0 +1,80 @@
+import os
+import tempfile
+
+import dataset
+import sparqlclient
+import transport
+from stub_server import Response, StubServer
+
+XSD_DATE = "http://www.w3.org/2001/XMLSchema#date"
+
+BODY = "".join([
+	'"p"\t"o"\t"literal"\t"tag"\n',
+	'<http://x/capital>\t<http://x/Paris>\t0\t""\n',
+	'<http://x/name>\t"Pomme"@fr\t1\t"@fr"\n',
+	'<http://x/date>\t"2001-01-01"^^<%s>\t1\t"%s"\n' % (XSD_DATE, XSD_DATE),
+])
+
+def get_pv_pairs(mode, path, url):
+	"""
+	Get the PV-pairs of one entity with every request going through a transport in mode.
+	"""
+	endpoint = dataset.DBPEDIA_ENDPOINT
+	dataset.DBPEDIA_ENDPOINT = url
+	transport.use_transport(mode, path)
+	try:
+		return dataset.get_pv_pairs("http://x/France")
+	finally:
+		transport.use_transport(transport.PASSTHROUGH)
+		dataset.DBPEDIA_ENDPOINT = endpoint
+
+def test_replayed_as_recorded():
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "archive")
+		stub = StubServer(default=Response(200, BODY, {"Content-Type": sparqlclient.TSV}), path="/sparql")
+		try:
+			recorded = get_pv_pairs(transport.RECORD, path, stub.url)
+		finally:
+			stub.close()
+		assert stub.requests == 1
+
+		# The endpoint is gone, the archive answers alone
+		replayed = get_pv_pairs(transport.REPLAY, path, stub.url)
+		assert replayed == recorded == [
+			("http://x/capital", "http://x/Paris"),
+			("http://x/name", "Pomme"),
+			("http://x/date", "2001-01-01"),
+		]
+		capital, name, date = [v for _, v in replayed]
+		assert not isinstance(capital, dataset.triplestore.Literal)
+		assert isinstance(name, dataset.triplestore.Literal) and name.language == "fr"
+		assert isinstance(date, dataset.triplestore.Literal) and date.datatype == XSD_DATE
+
+		endpoint = dataset.DBPEDIA_ENDPOINT
+		dataset.DBPEDIA_ENDPOINT = stub.url
+		transport.use_transport(transport.REPLAY, path)
+		try:
+			dataset.get_pv_pairs("http://x/Spain")
+			assert False, "an unrecorded request must not be replayed"
+		except transport.ReplayMiss:
+			pass
+		finally:
+			transport.use_transport(transport.PASSTHROUGH)
+			dataset.DBPEDIA_ENDPOINT = endpoint
+
+def test_search_replayed():
+	with tempfile.TemporaryDirectory() as directory:
+		path = os.path.join(directory, "archive")
+		recorder = transport.Transport(transport.RECORD, path)
+		assert recorder.search("google", "apple color", lambda keyword: 1234) == 1234
+		recorder.close()
+		player = transport.Transport(transport.REPLAY, path)
+		try:
+			assert player.search("google", "apple color", lambda keyword: 0) == 1234
+		finally:
+			player.close()
+
+if __name__ == '__main__':
+	test_replayed_as_recorded()
+	test_search_replayed()
+	print("ok")
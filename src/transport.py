@@ -0,0 +1,206 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import mmap
+import os
+import threading
+import zlib
+from collections import OrderedDict
+
+import cache
+import scheduler
+import sparqlclient
+
+__author__ = "Sephirothxlx"
+
+PASSTHROUGH = "passthrough"  # send every request over the network
+RECORD = "record"  # send every request and store its response in the archive
+REPLAY = "replay"  # answer every request from the archive, never touching the network
+
+#Number of decompressed responses kept in memory while replaying
+REPLAY_CACHE_SIZE = 1024
+
+class ReplayMiss(KeyError):
+    """
+    Raised in replay mode for a request that was not recorded.
+    """
+
+def request_key(kind, target, request):
+    """
+    :param kind: "sparql", "select" or "search"
+    :param target: endpoint or engine name
+    :param request: query or keyword
+    :return: <str> hex digest identifying the request
+    """
+    payload = json.dumps([kind, target, cache.normalize_query(request)])
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+class Archive(object):
+    """
+    Append-only store of compressed responses.
+    Responses are zlib-compressed one by one into <path>.dat, and <path>.idx lists the key,
+    offset and length of each of them, so replay only loads the index and decompresses
+    the responses actually requested.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: path prefix of the archive files
+        """
+        self.path = path
+        self.index = {}
+        self._data = None
+        self._map = None
+        self._index_file = None
+        self._lock = threading.Lock()
+        self._decompressed = OrderedDict()
+        if os.path.exists(path + ".idx"):
+            with open(path + ".idx", "r", encoding="utf-8") as f:
+                for line in f:
+                    key, offset, length = line.split()
+                    self.index[key] = (int(offset), int(length))
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        """
+        :param key: <str> built by request_key()
+        :return: decoded response
+        """
+        with self._lock:
+            if key in self._decompressed:
+                self._decompressed.move_to_end(key)
+                return self._decompressed[key]
+            offset, length = self.index[key]
+            if self._map is None:
+                if self._data is not None:
+                    self._data.flush()
+                with open(self.path + ".dat", "rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            value = json.loads(zlib.decompress(self._map[offset:offset + length]).decode("utf-8"))
+            self._decompressed[key] = value
+            if len(self._decompressed) > REPLAY_CACHE_SIZE:
+                self._decompressed.popitem(last=False)
+            return value
+
+    def put(self, key, value):
+        """
+        Store a response, unless one is already stored for the key.
+        :param key: <str> built by request_key()
+        :param value: JSON serializable response
+        """
+        data = zlib.compress(json.dumps(value).encode("utf-8"))
+        with self._lock:
+            if key in self.index:
+                return
+            if self._data is None:
+                self._data = open(self.path + ".dat", "ab")
+                self._index_file = open(self.path + ".idx", "a", encoding="utf-8")
+            offset = self._data.tell()
+            self._data.write(data)
+            # The response is on disk before the index refers to it, so that an interrupted
+            # recording never leaves an index entry past the end of the data
+            self._data.flush()
+            self._index_file.write("{} {} {}\n".format(key, offset, len(data)))
+            self._index_file.flush()
+            self.index[key] = (offset, len(data))
+            if self._map is not None:
+                # The mapping does not cover the new record, map the file again on next read
+                self._map.close()
+                self._map = None
+
+    def close(self):
+        with self._lock:
+            for f in (self._data, self._index_file, self._map):
+                if f is not None:
+                    f.close()
+            self._data = self._index_file = self._map = None
+
+class Transport(object):
+    """
+    Layer between the lib and the network, recording or replaying SPARQL and search traffic.
+    """
+
+    def __init__(self, mode=PASSTHROUGH, path=None):
+        """
+        :param mode: PASSTHROUGH, RECORD or REPLAY
+        :param path: path prefix of the archive, needed to record or replay
+        """
+        if mode not in (PASSTHROUGH, RECORD, REPLAY):
+            raise ValueError("Unknown transport mode: {}".format(mode))
+        if mode != PASSTHROUGH and path is None:
+            raise ValueError("An archive path is needed to {}".format(mode))
+        self.mode = mode
+        self.archive = Archive(path) if path is not None else None
+        # The result caches sit above the transport, they are bypassed while recording or replaying
+        # so that every request reaches the archive
+        self.cached = mode == PASSTHROUGH
+
+    def _call(self, kind, target, request, send):
+        # Requests actually sent go through the scheduler of their target, which retries failures
+        scheduled = lambda: scheduler.get_scheduler("search" if kind == "search" else "sparql", target).call(send)
+        if self.mode == PASSTHROUGH:
+            return scheduled()
+        key = request_key(kind, target, request)
+        if self.mode == REPLAY:
+            if key not in self.archive:
+                raise ReplayMiss("No recorded response for {} request to {}: {}".format(kind, target, request))
+            return self.archive.get(key)
+        value = scheduled()
+        self.archive.put(key, value)
+        return value
+
+    def sparql(self, endpoint, query, stats=None):
+        """
+        Send a SPARQL query.
+        :param endpoint: dataset's address
+        :param query: SPARQL query
+        :param stats: <dict> filled with the number of "bytes" received if given
+        :return: <dict> of SPARQL JSON results
+        """
+        return self._call("sparql", endpoint, query, lambda: sparqlclient.get_client(endpoint).query(query, stats))
+
+    def select(self, endpoint, query, stats=None):
+        """
+        Send a SPARQL SELECT query for compact TSV results.
+        :param endpoint: dataset's address
+        :param query: SPARQL SELECT query
+        :param stats: <dict> filled with the number of "bytes" received if given
+        :return: (<list> of variable names, <list> of rows)
+        """
+        return self._call("select", endpoint, query, lambda: sparqlclient.get_client(endpoint).select(query, stats))
+
+    def search(self, engine, keyword, count):
+        """
+        Get the search results number of a keyword.
+        :param engine: <str> name of the engine
+        :param keyword: <str>
+        :param count: function sending the request for the keyword
+        :return: search results number
+        """
+        return self._call("search", engine, keyword, lambda: count(keyword))
+
+    def close(self):
+        if self.archive is not None:
+            self.archive.close()
+
+#Transport used by dataset.py and search.py
+TRANSPORT = Transport()
+
+def use_transport(mode, path=None):
+    """
+    Switch every SPARQL and search request to another mode.
+    :param mode: PASSTHROUGH, RECORD or REPLAY
+    :param path: path prefix of the archive
+    :return: <Transport>
+    """
+    global TRANSPORT
+    TRANSPORT.close()
+    TRANSPORT = Transport(mode, path)
+    return TRANSPORT
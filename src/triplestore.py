@@ -0,0 +1,355 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import bz2
+import gzip
+import logging
+import re
+import threading
+
+__author__ = "Sephirothxlx"
+
+RDF_TYPE = "http://www.w3.org/1999/02/22-rdf-syntax-ns#type"
+RDFS_LABEL = "http://www.w3.org/2000/01/rdf-schema#label"
+RDFS_SUBCLASSOF = "http://www.w3.org/2000/01/rdf-schema#subClassOf"
+FOAF_NAME = "http://xmlns.com/foaf/0.1/name"
+DCT_SUBJECT = "http://purl.org/dc/terms/subject"
+DBO_TYPE = "http://dbpedia.org/ontology/type"
+DBO_CATEGORY = "http://dbpedia.org/ontology/category"
+DBR_TYPE = "http://dbpedia.org/resource/type"
+OWL_TYPE = "http://www.w3.org/2002/07/owl#type"
+DBPEDIA2_TYPE = "http://dbpedia.org/property/type"
+
+#Same properties as the FILTERs of dataset.get_pv_pairs()
+IGNORED_PROPERTIES = {
+    "http://dbpedia.org/ontology/wikiPageID",
+    "http://dbpedia.org/ontology/wikiPageRevisionID",
+    "http://dbpedia.org/ontology/wikiPageWikiLink",
+    "http://dbpedia.org/ontology/wikiPageExternalLink",
+}
+
+#One N-Triples statement: subject, predicate and the rest of the line as object
+NTRIPLE_PATTERN = re.compile(r'^\s*(<[^>]*>|_:\S+)\s+(<[^>]*>)\s+(.*?)\s*\.\s*$')
+LITERAL_PATTERN = re.compile(r'^"((?:[^"\\]|\\.)*)"(?:@([A-Za-z0-9\-]+)|\^\^<([^>]*)>)?$')
+ESCAPE_PATTERN = re.compile(r'\\(u[0-9A-Fa-f]{4}|U[0-9A-Fa-f]{8}|.)')
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+ESCAPES = {"t": "\t", "b": "\b", "n": "\n", "r": "\r", "f": "\f", '"': '"', "'": "'", "\\": "\\"}
+
+class Literal(str):
+    """
+    Lexical form of an RDF literal, told apart from IRIs and blank nodes which are plain <str>.
+    It compares and hashes as its plain value, so attributes are counted the same either way.
+    Its language tag or datatype only matter on output, they are set on the instance when known.
+    """
+    language = None
+    datatype = None
+
+    def __new__(cls, value, language=None, datatype=None):
+        """
+        :param value: <str> lexical form
+        :param language: language tag, None if untagged
+        :param datatype: IRI of the datatype, None for a plain xsd:string
+        """
+        literal = str.__new__(cls, value)
+        if language:
+            literal.language = language
+        elif datatype and datatype != XSD_STRING:
+            literal.datatype = datatype
+        return literal
+
+    def strip(self, chars=None):
+        """
+        :return: <Literal> stripped, with the same language tag or datatype
+        """
+        return Literal(str.strip(self, chars), self.language, self.datatype)
+
+def dump_term(value):
+    """
+    :param value: <str> IRI or <Literal>
+    :return: <str> keeping the kind of the term, for JSON or SQLite storage:
+        the IRI, or the value after '"', prefixed with "@language" or "^datatype" if any
+    """
+    if not isinstance(value, Literal):
+        return value
+    if value.language is not None:
+        return "@" + value.language + '"' + value
+    if value.datatype is not None:
+        return "^" + value.datatype + '"' + value
+    return '"' + value
+
+def load_term(data):
+    """
+    :param data: <str> built by dump_term()
+    :return: <str> IRI or <Literal>
+    """
+    if data.startswith('"'):
+        return Literal(data[1:])
+    if data.startswith(("@", "^")):
+        # Neither language tags nor IRIs contain '"'
+        tag, value = data[1:].split('"', 1)
+        return Literal(value, tag, None) if data[0] == "@" else Literal(value, None, tag)
+    return data
+
+def _unescape(match):
+    code = match.group(1)
+    if code[0] in "uU":
+        return chr(int(code[1:], 16))
+    return ESCAPES.get(code, code)
+
+def parse_term(term):
+    """
+    Parse an N-Triples term into its value, as SPARQL JSON results would report it.
+    :param term: <str> IRI, blank node or literal in N-Triples syntax
+    :return: (value, language), value is a <Literal> for a literal, language is None unless it is tagged
+    """
+    if term.startswith("<"):
+        return term[1:-1], None
+    if term.startswith("_:"):
+        return term, None
+    match = LITERAL_PATTERN.match(term)
+    if match is None:
+        raise ValueError("Invalid N-Triples term: {}".format(term))
+    return Literal(ESCAPE_PATTERN.sub(_unescape, match.group(1)), match.group(2), match.group(3)), match.group(2)
+
+class TermDictionary(object):
+    """
+    Bidirectional mapping between terms and dense integer ids.
+    New terms are interned under a lock, so a dictionary can be shared by concurrent extractions.
+    """
+
+    def __init__(self):
+        self.term2id = {}
+        self.id2term = []
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.id2term)
+
+    def encode(self, term):
+        """
+        :param term: <str>
+        :return: <int> id of the term, a new one is allocated if unknown
+        """
+        term_id = self.term2id.get(term)
+        if term_id is None:
+            with self._lock:
+                # Another thread may have interned the term meanwhile
+                term_id = self.term2id.get(term)
+                if term_id is None:
+                    term_id = len(self.id2term)
+                    self.id2term.append(term)
+                    self.term2id[term] = term_id
+        return term_id
+
+    def lookup(self, term):
+        """
+        :param term: <str>
+        :return: <int> id of the term, None if unknown
+        """
+        return self.term2id.get(term)
+
+    def decode(self, term_id):
+        return self.id2term[term_id]
+
+class TripleStore(object):
+    """
+    In-process triple store with SPO, POS and OSP permutation indexes over integer-encoded terms.
+    It implements the query functions of dataset.py, so it can be selected with dataset.use_backend().
+    """
+
+    def __init__(self):
+        self.terms = TermDictionary()
+        self.spo = {}
+        self.pos = {}
+        self.osp = {}
+        self.labels = {}  # subject id -> English foaf:name / rdfs:label
+        self.size = 0
+
+    def add(self, subject, predicate, value, language=None):
+        """
+        Add a triple to the store.
+        :param subject: uuid of the subject
+        :param predicate: uuid of the property
+        :param value: uuid or literal value of the object
+        :param language: language tag of a literal object
+        """
+        s = self.terms.encode(subject)
+        p = self.terms.encode(predicate)
+        o = self.terms.encode(value)
+        objects = self.spo.setdefault(s, {}).setdefault(p, set())
+        if o in objects:
+            return
+        objects.add(o)
+        self.pos.setdefault(p, {}).setdefault(o, set()).add(s)
+        self.osp.setdefault(o, {}).setdefault(s, set()).add(p)
+        self.size += 1
+        if language == "en" and predicate in (FOAF_NAME, RDFS_LABEL):
+            self.labels.setdefault(s, value)
+
+    def load(self, filename):
+        """
+        Load an N-Triples dump, optionally gzip or bzip2 compressed.
+        DBpedia's .ttl dumps are written one triple per line and load as well.
+        :param filename: path of the dump
+        :return: <int> number of triples loaded
+        """
+        if filename.endswith(".gz"):
+            f = gzip.open(filename, "rt", encoding="utf-8")
+        elif filename.endswith(".bz2"):
+            f = bz2.open(filename, "rt", encoding="utf-8")
+        else:
+            f = open(filename, "r", encoding="utf-8")
+        before = self.size
+        with f:
+            for line in f:
+                if not line.strip() or line.lstrip().startswith(("#", "@prefix", "@base")):
+                    continue
+                match = NTRIPLE_PATTERN.match(line)
+                if match is None:
+                    logging.warning("Skipping malformed line in {}: {}".format(filename, line.strip()))
+                    continue
+                subject = parse_term(match.group(1))[0]
+                predicate = parse_term(match.group(2))[0]
+                value, language = parse_term(match.group(3))
+                self.add(subject, predicate, value, language)
+        return self.size - before
+
+    def __len__(self):
+        return self.size
+
+    def _objects(self, subject, predicates):
+        s = self.terms.lookup(subject)
+        if s is None or s not in self.spo:
+            return set()
+        result = set()
+        for predicate in predicates:
+            p = self.terms.lookup(predicate)
+            if p is not None:
+                result.update(self.spo[s].get(p, ()))
+        return result
+
+    def _subjects(self, predicates, value):
+        o = self.terms.lookup(value)
+        if o is None:
+            return set()
+        result = set()
+        for predicate in predicates:
+            p = self.terms.lookup(predicate)
+            if p is not None and p in self.pos:
+                result.update(self.pos[p].get(o, ()))
+        return result
+
+    def _decode_all(self, ids):
+        return sorted(self.terms.decode(i) for i in ids)
+
+    def get_categories(self, entity_id):
+        return self._decode_all(self._objects(entity_id, (DCT_SUBJECT, DBO_CATEGORY)))
+
+    def get_types(self, entity_id):
+        types = self._objects(entity_id, (DBO_TYPE, RDF_TYPE, DBPEDIA2_TYPE))
+        # Drop every type that is a direct super class of another dbo:type / rdf:type
+        subtypes = self._objects(entity_id, (DBO_TYPE, RDF_TYPE))
+        subclass_of = self.terms.lookup(RDFS_SUBCLASSOF)
+        super_types = set()
+        for t in subtypes:
+            for o in self.spo.get(t, {}).get(subclass_of, ()):
+                if o != t:
+                    super_types.add(o)
+        return self._decode_all(types - super_types)
+
+    def get_super_classes(self, class_id):
+        return self._decode_all(self._objects(class_id, (RDFS_SUBCLASSOF,)))
+
+    def get_type_parents_many(self, type_ids):
+        return {type_id: self.get_super_classes(type_id) + self.get_types(type_id) for type_id in type_ids}
+
+    def get_type_members(self, type_id):
+        return self._decode_all(self._subjects((DBO_TYPE, RDF_TYPE, DBR_TYPE, OWL_TYPE), type_id))
+
+    def get_category_member(self, category_id):
+        return self._decode_all(self._subjects((DCT_SUBJECT, DBO_CATEGORY), category_id))
+
+    def iter_type_members(self, type_id, page_size=None):
+        return iter(self.get_type_members(type_id))
+
+    def iter_category_member(self, category_id, page_size=None):
+        return iter(self.get_category_member(category_id))
+
+    def get_pv_pairs(self, entity_id):
+        s = self.terms.lookup(entity_id)
+        if s is None:
+            return []
+        pairs = []
+        for p, objects in self.spo.get(s, {}).items():
+            property_id = self.terms.decode(p)
+            if property_id in IGNORED_PROPERTIES:
+                continue
+            pairs.extend((property_id, self.terms.decode(o)) for o in objects)
+        return sorted(pairs)
+
+    def get_pv_pairs_many(self, entity_ids, chunk_size=None):
+        return {entity_id: self.get_pv_pairs(entity_id) for entity_id in entity_ids}
+
+    def has_pv_pair(self, subject_id, property_id, value_id):
+        s = self.terms.lookup(subject_id)
+        p = self.terms.lookup(property_id)
+        o = self.terms.lookup(value_id)
+        if s is None or p is None or o is None:
+            return False
+        return o in self.spo.get(s, {}).get(p, ())
+
+    def count_pv_support(self, subject_ids, property_id):
+        p = self.terms.lookup(property_id)
+        support = {}
+        if p is None:
+            return support
+        for subject_id in set(subject_ids):
+            s = self.terms.lookup(subject_id)
+            if s is None:
+                continue
+            for o in self.spo.get(s, {}).get(p, ()):
+                value = self.terms.decode(o)
+                support[value] = support.get(value, 0) + 1
+        return support
+
+    def count_multi_valued(self, property_ids, target_node):
+        members = set()
+        for x in target_node.categories:
+            if x.uuid != "":
+                members.update(self._subjects((DCT_SUBJECT,), x.uuid.rstrip("\n")))
+        counts = {}
+        for property_id in property_ids:
+            property_id = property_id.lstrip('\'').rstrip('\'')
+            p = self.terms.lookup(property_id)
+            total = 0
+            multi = 0
+            if p is not None:
+                for s in members:
+                    n = len(self.spo.get(s, {}).get(p, ()))
+                    if n > 0:
+                        total += 1
+                    if n > 1:
+                        multi += 1
+            counts[property_id] = (total, multi)
+        return counts
+
+    def get_resource_name(self, resource_id):
+        s = self.terms.lookup(resource_id)
+        if s is not None and s in self.labels:
+            return self.labels[s]
+        return resource_id.rsplit("/", 1)[-1]
+
+    def get_resource_names(self, resource_ids, chunk_size=None):
+        return {r: self.get_resource_name(r) for r in resource_ids}
+
+def load(*filenames):
+    """
+    Build a triple store from one or more dump files.
+    :param filenames: paths of N-Triples dumps
+    :return: <TripleStore>
+    """
+    store = TripleStore()
+    for filename in filenames:
+        n = store.load(filename)
+        logging.info("Loaded {} triples from {}".format(n, filename))
+    return store
@@ -3,7 +3,9 @@
 
 import search
 import dataset
-from dbnode import Node
+import metrics
+import writer
+from dbnode import id2node
 
 __author__ = "Sephirothxlx"
 
@@ -12,23 +14,30 @@ A = 0.5
 #coefficiency for siblings
 B = 0.5
 
-def validate(target_node, attributes):
+def validate(target_node, attributes, sibling_support=None, siblings=None, scores=None, num_siblings=None):
 	"""
 	Validate every single valued attribute if it is valid
 	:param target_node: <Node>
 	:param attributes: <list> of (p, v)
+	:param sibling_support: <dict> of {(p, v): number of siblings having it}, covering at least the attributes
+	:param siblings: <list> of <Node> the sibling scores are computed on, target_node.siblings if not given
+	:param scores: <dict> filled with {(p, v): score} for every conflicting value if given
+	:param num_siblings: number of siblings the support is counted on, len(siblings) if not given,
+		the siblings are then not needed when the support is given
 	:return: <list> of (p, v) 
 	"""
 	target_id = target_node.uuid
-	target_siblings = target_node.siblings
+	target_siblings = target_node.siblings if siblings is None else siblings
 
 	multi_value = set()
 	#Use a dictionary to store the single_value
 	single_value = {}
 
 	conflict = set()
+	with metrics.stage("multiplicity"):
+		multi_valued = dataset.get_multi_valued({x[0] for x in attributes}, target_node)
 	for x in attributes:
-		if dataset.is_multi_valued(x[0],target_node) == False:
+		if multi_valued[x[0]] == False:
 			if x[0] in single_value.keys():
 				conflict.add((x[0],x[1]))
 				conflict.add((x[0],single_value[x[0]]))
@@ -39,8 +48,9 @@ def validate(target_node, attributes):
 
 	final_single_value = set()
 	if len(conflict) != 0:
-		search_score = validate_by_search(target_id, conflict)
-		sibling_score = validate_by_siblings(target_siblings, conflict)
+		with metrics.stage("validation"):
+			search_score = validate_by_search(target_id, conflict)
+			sibling_score = validate_by_siblings(target_siblings, conflict, sibling_support, num_siblings)
 
 		final_score = {}
 		for x in search_score.keys():
@@ -50,6 +60,8 @@ def validate(target_node, attributes):
 					final_score[x][y] = score
 				else:
 					final_score.update({x: {y: score}})
+				if scores is not None:
+					scores[(x, y)] = score
 
 		i = 0
 		temp0 = ""
@@ -63,6 +75,7 @@ def validate(target_node, attributes):
 			final_single_value.add((x,single_value[x]))
 	else:
 		for x in single_value.keys():
+			# Literals stay literals with their language tag or datatype, see triplestore.Literal.strip()
 			final_single_value.add((x,single_value[x].strip()))
 
 	final_attributes = multi_value | final_single_value
@@ -77,15 +90,16 @@ def validate_by_search(target_id, conflict):
 	"""
 
 	res = {}
+	keywords = {}
 	for x in conflict:
 		s = target_id.split("/")[-1]
 		p = x[0].split("/")[-1]
 		o = x[1].split("/")[-1]
-		keyword = s + " " + p +" "+o
-		google = search.get_search_results_Google(keyword)
-		baidu = search.get_search_results_Baidu(keyword)
-		bing = search.get_search_results_Bing(keyword)
-		total = google+baidu+bing
+		keywords[x] = s + " " + p +" "+o
+	# Every engine and every conflict are searched concurrently
+	numbers = search.get_search_results_many(keywords.values())
+	for x in conflict:
+		total = numbers[keywords[x]]
 		if x[0] in res:
 			res[x[0]][x[1]] = total
 		else:
@@ -101,11 +115,13 @@ def validate_by_search(target_id, conflict):
 
 	return res
 
-def validate_by_siblings(siblings, conflict):
+def validate_by_siblings(siblings, conflict, sibling_support=None, num_siblings=None):
 	"""
 	Calculate every score for single value.
 	:param single_vlaue: <dictionary> of {p:{v}}
 	:param siblings: <Node> of siblings
+	:param sibling_support: <dict> of {(p, v): number of siblings having it}, queried from dataset if not given
+	:param num_siblings: number of siblings, len(siblings) if not given
 	:return: <dict> of {p:{v:score}}
 	"""
 	res = {}
@@ -119,38 +135,40 @@ def validate_by_siblings(siblings, conflict):
 	# 		res.update({x[0]:{x[1]:1}})
 	# return res
 
-	total_number = len(siblings)
+	total_number = len(siblings) if num_siblings is None else num_siblings
+	if sibling_support is None:
+		# One aggregate query per conflicting property rather than one per sibling
+		sibling_ids = [s.uuid for s in siblings]
+		support = {}
+		for p in {x[0] for x in conflict}:
+			support[p] = dataset.count_pv_support(sibling_ids, p)
 	for x in conflict:
-		n = 0
-		for s in siblings:
-			print (1)
-			if dataset.has_pv_pair(s.uuid, x[0], x[1]) == True:
-				n += 1
-		m = n / total_number
+		if sibling_support is not None:
+			n = sibling_support.get(x, 0)
+		else:
+			n = support[x[0]].get(x[1], 0)
+		m = n / total_number if total_number else 0
 		if x[0] in res:
-			res[x[0]][x[1]] = 1
+			res[x[0]][x[1]] = m
 		else:
-			res.update({x[0]:{x[1]:1}})
+			res.update({x[0]:{x[1]:m}})
 	return res
 
 if __name__ == '__main__':
-	n = Node("http://dbpedia.org/resource/Huawei_P9")
+	n = id2node("http://dbpedia.org/resource/Huawei_P9")
 	siblings = set()
 	f = open("siblings.txt", "r", encoding="utf-8")
 	for l in f.readlines():
 		if l != "":
-			siblings.add(Node(l.strip('\n')))
+			siblings.add(id2node(l.strip('\n')))
 	attributes = set()
-	f = open("result.txt", "r", encoding="utf-8")
-	for l in f.readlines():
-		if l != "":
-			l = l.lstrip('(')
-			l = l.rstrip(')\n')
-			attributes.add((l.split(",")[0].strip('\'').strip(),l.split(",")[1].strip().strip('\'').strip()))
+	for target, target_attributes in writer.read_results("result.jsonl"):
+		if target == n.uuid:
+			attributes = target_attributes
 	n.siblings = siblings
 	c = set()
-	c.add(Node("http://dbpedia.org/resource/Category:Smartphones"))
-	c.add(Node("http://dbpedia.org/resource/Category:Mobile_phones_introduced_in_2016"))
+	c.add(id2node("http://dbpedia.org/resource/Category:Smartphones"))
+	c.add(id2node("http://dbpedia.org/resource/Category:Mobile_phones_introduced_in_2016"))
 	n.categories = c
 	test_ress=validate(n, attributes)
 	print (test_ress)
\ No newline at end of file
@@ -0,0 +1,60 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import metrics
+
+__author__ = "Sephirothxlx"
+
+#Default maximum number of queries in flight, 1 keeps everything sequential
+MAX_WORKERS = 1
+
+def map_bounded(func, items, max_workers=None):
+    """
+    Apply func to every item with at most max_workers calls running at the same time.
+    Exceptions are caught per item instead of aborting the whole map.
+    :param func: function of one argument
+    :param items: iterable of arguments
+    :param max_workers: maximum number of concurrent calls, MAX_WORKERS if not given
+    :return: <list> of (item, result, exception) in the order of items, exception is None on success
+    """
+    max_workers = max_workers or MAX_WORKERS
+    items = list(items)
+
+    def call(item):
+        try:
+            return item, func(item), None
+        except Exception as e:
+            return item, None, e
+
+    if max_workers <= 1 or len(items) <= 1:
+        return [call(item) for item in items]
+
+    # Calls made by the pool are recorded into the metrics of the calling thread
+    caller_metrics = metrics.current()
+
+    def call_in_worker(item):
+        previous = metrics.activate(caller_metrics)
+        try:
+            return call(item)
+        finally:
+            metrics.activate(previous)
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(items))) as executor:
+        return list(executor.map(call_in_worker, items))
+
+def chunked(items, size):
+    """
+    Split an iterable into lists of at most size items, consuming it lazily.
+    :param items: iterable
+    :param size: <int> maximum length of a chunk
+    :return: generator of <list>
+    """
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
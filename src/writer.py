@@ -0,0 +1,120 @@
+# !/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+import json
+import threading
+
+from triplestore import Literal
+
+__author__ = "Sephirothxlx"
+
+JSONL = "jsonl"
+NTRIPLES = "ntriples"
+TEXT = "text"  # the historical format: uuid, then one str(tuple) per line, then a blank line
+
+#Bytes buffered before the output file is written to
+BUFFER_SIZE = 1 << 20
+
+def guess_format(filename):
+    """
+    :param filename: path of the output file
+    :return: JSONL for .jsonl / .json, NTRIPLES for .nt, TEXT otherwise
+    """
+    if filename.endswith((".jsonl", ".json")):
+        return JSONL
+    if filename.endswith(".nt"):
+        return NTRIPLES
+    return TEXT
+
+def _ntriples_term(value):
+    # The kind of the value comes from the query results, see dataset.get_pv_pairs()
+    if not isinstance(value, Literal):
+        return value if value.startswith("_:") else "<{}>".format(value)
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n").replace("\r", "\\r")
+    if value.language is not None:
+        return '"{}"@{}'.format(escaped, value.language)
+    if value.datatype is not None:
+        return '"{}"^^<{}>'.format(escaped, value.datatype)
+    return '"{}"'.format(escaped)
+
+class ResultWriter(object):
+    """
+    Buffered writer of extraction results, kept open for a whole batch.
+    Every target is serialized before the lock is taken and written in one call,
+    so concurrent workers never interleave their lines.
+    """
+
+    def __init__(self, filename, format=None, mode="a", buffer_size=BUFFER_SIZE):
+        """
+        :param filename: path of the output file
+        :param format: JSONL, NTRIPLES or TEXT, guessed from the extension if not given
+        :param mode: "a" to append to the file, "w" to overwrite it
+        :param buffer_size: bytes buffered before writing to the file
+        """
+        self.filename = filename
+        self.format = format or guess_format(filename)
+        if self.format not in (JSONL, NTRIPLES, TEXT):
+            raise ValueError("Unknown result format: {}".format(self.format))
+        self._file = open(filename, mode, encoding="utf-8", buffering=buffer_size)
+        self._lock = threading.Lock()
+        self.num_targets = 0
+
+    def _serialize(self, target_uuid, attributes, support, num_siblings, scores):
+        attributes = sorted(attributes)
+        if self.format == TEXT:
+            return target_uuid + "\n" + "".join(str(a) + "\n" for a in attributes) + "\n"
+        if self.format == NTRIPLES:
+            subject = "<{}>".format(target_uuid)
+            return "".join("{} <{}> {} .\n".format(subject, p, _ntriples_term(v)) for p, v in attributes)
+        record = {"target": target_uuid, "attributes": []}
+        if num_siblings is not None:
+            record["siblings"] = num_siblings
+        for p, v in attributes:
+            attribute = {"property": p, "value": v}
+            if support is not None:
+                attribute["support"] = support.get((p, v), 0)
+            if scores is not None and (p, v) in scores:
+                attribute["score"] = scores[(p, v)]
+            record["attributes"].append(attribute)
+        return json.dumps(record, ensure_ascii=False) + "\n"
+
+    def write(self, target_uuid, attributes, support=None, num_siblings=None, scores=None):
+        """
+        Write the extracted attributes of one target.
+        :param target_uuid: uuid of the target
+        :param attributes: iterable of (property, value)
+        :param support: <dict> of {(property, value): number of siblings having it}, JSONL only
+        :param num_siblings: number of siblings the support is counted on, JSONL only
+        :param scores: <dict> of {(property, value): validation score}, JSONL only
+        """
+        data = self._serialize(target_uuid, attributes, support, num_siblings, scores)
+        with self._lock:
+            self._file.write(data)
+            self.num_targets += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def read_results(filename):
+    """
+    Read JSONL results in a single pass.
+    :param filename: path of a file written by a JSONL <ResultWriter>
+    :return: generator of (target uuid, <set> of (property, value))
+    """
+    with open(filename, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["target"], {(a["property"], a["value"]) for a in record["attributes"]}